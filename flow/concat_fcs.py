@@ -20,226 +20,178 @@ URL:        https://github.com/rickert-lab/tools
 Version:    0.2
 """
 
-import array
-import fnmatch
-import math
+import argparse
 import os
 import sys
 import warnings
 
-import flowio as fio
-import numpy as np
-
 from datetime import datetime
 
-
-def cons_idxs(flow_chans, consens_chans):
-    """Return the indices of all flow channels matchting the consensus channels by index and name.
-
-    Keyword arguments:
-    flow_chans -- FlowIO channel dictionary
-    consens_chans -- consensus channel dictionary
-    """
-    return sorted(
-        [
-            pos - 1  # integer
-            for pos, chan in flow_chans.items()
-            if pos in consens_chans and get_name(chan) == consens_chans[pos]
-        ]
-    )
-
-
-def get_files(path="", pat="*", anti="", recurse=False):
-    """Iterate through all files in a directory structure and
-       return a list of matching files.
-
-    Keyword arguments:
-    path -- the path to a directory containing files (default "")
-    pat -- string pattern that needs to be part of the file name (default "None")
-    anti -- string pattern that may not be part of the file name (default "None")
-    recurse -- boolen that allows the function to work recursively (default "False")
-    """
-    file_list = []
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            file = os.path.join(root, file)
-            if fnmatch.fnmatch(file, pat) and not fnmatch.fnmatch(file, anti):
-                file_list.append(file)
-        if not recurse:
-            break  # from `os.walk()`
-    return file_list
-
-
-def get_name(channel):
-    """Get channel label from flowio channel dictionary.
-    Try to retrieve the optional long name first and
-    if that fails try to get the short name.
-
-    Keyword arguments:
-    channels - the flowio channel dictionary
-    """
-    return (
-        channel.get("pns") or channel["pnn"]
-    )  # 'pns' value must be True, i.e. it must differ from "", None, False
+from flowtools import concat, verify
+from flowtools.fcs import DATA_TYPES
+from flowtools.transform import add_arguments, get_transforms
 
 
 def min_warning(message, category, filename, lineno, line=None):
     return f"\n{category.__name__}: {message}\n"
 
 
-# check if tests are running
-pytest_running = "PYTEST_CURRENT_TEST" in os.environ
-
-# get flow file paths
-flow_path = (
-    os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
-)
-time_stamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-concat_path = os.path.join(
-    flow_path if not pytest_running else r"./tests",
-    f"{os.path.basename(flow_path)}{'_' + time_stamp + '_' if not pytest_running else '_'}concat.fcs",
-)
-
-# set warning parameters
-warnings.formatwarning = min_warning  # category and message
-warnings.simplefilter("always", UserWarning)  # do repeat
-
-
-# collect channels from flow data
-flow_paths = sorted(
-    get_files(path=os.path.abspath(flow_path), pat="*.fcs", anti="*_concat.fcs")
-)
-flow_paths_len = len(flow_paths)
-if flow_paths_len:
-    print("Checking channels:")
-    pos_data = {}  # {pos: {'name': str, 'count': int}}
-    for count, flow_path in enumerate(flow_paths):
-        # print progress
-        if not (count + 1) % 100 or count == 0 or (count + 1) == flow_paths_len:
-            print(f"{count + 1}", end="", flush=True)
-        else:
-            print(".", end="", flush=True)
-
-        # read flow data headers
-        flow_data = fio.FlowData(flow_path, only_text=True)
-        flow_chans = flow_data.channels
-
-        # track channel positions and names
-        for pos, chan in flow_chans.items():
-            chan_name = get_name(chan)
-            if pos not in pos_data:
-                pos_data[pos] = {"name": chan_name, "count": 0}
-            if pos_data[pos]["name"] == chan_name:
-                pos_data[pos]["count"] += 1
-            else:
-                warnings.warn(
-                    f'"{os.path.basename(flow_path)}" @{pos} = "{chan["pnn"]}"'
-                )
-
-    # separate consensus from non-consensus channels
-    consens_chans = {
-        pos: data["name"]
-        for pos, data in pos_data.items()
-        if data["count"] == flow_paths_len
-    }
-    nonsens_chans = {
-        pos: data["name"]
-        for pos, data in pos_data.items()
-        if data["count"] < flow_paths_len
-    }
-    consens_count = len(consens_chans)
-
-    print(f"\nRemoving channels:\n{nonsens_chans}")
-    print(f"\nKeeping channels:\n{consens_chans}")
-
-    # confirm processing
-    if nonsens_chans:
-        response = (
-            "y"
-            if pytest_running
-            else input("\nPlease confirm concatenation [Y/n]: ").strip().lower()
+if __name__ == "__main__":
+    # parse command line arguments
+    parser = argparse.ArgumentParser(description="Concatenate flow cytometry files.")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="write events to disk while reading files to limit memory usage",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="maximum number of files read in parallel when checking channels",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="keep file metadata in a JSON file to only read new or changed files",
+    )
+    parser.add_argument(
+        "--append",
+        metavar="FILE",
+        default="",
+        help="add new files to a concatenated file written with --stream",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="maximum number of files read and filtered in parallel",
+    )
+    parser.add_argument(
+        "--recurse",
+        action="store_true",
+        help="include files in subdirectories",
+    )
+    parser.add_argument(
+        "--max-events",
+        type=int,
+        default=0,
+        help="split output into files with at most this many events",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=0,
+        help="split output into files of at most this many bytes",
+    )
+    parser.add_argument(
+        "--channels",
+        nargs="+",
+        default=None,
+        help="only keep consensus channels matching these names or patterns (pnn or pns)",
+    )
+    parser.add_argument(
+        "--exclude-channels",
+        nargs="+",
+        default=None,
+        help="drop consensus channels matching these names or patterns (pnn or pns)",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=list(DATA_TYPES),
+        default=None,
+        help="data type of events (default: float32)",
+    )
+    add_arguments(parser)  # compensation and transforms
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="write time and memory per stage and file to JSON and CSV files",
+    )
+    parser.add_argument(
+        "--skip-duplicates",
+        action="store_true",
+        help="skip files with the same events as an earlier file instead of only reporting them",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check checksums of files in parallel instead of concatenating them",
+    )
+    args = parser.parse_args()
+    if args.append and (args.max_events or args.max_bytes):
+        parser.error("--append cannot be combined with --max-events or --max-bytes")
+    if args.append and (args.channels or args.exclude_channels):
+        parser.error(
+            "--append cannot be combined with --channels or --exclude-channels"
         )
-        if response and response != "y":
-            sys.exit(0)  # quit without error
-
-    # process flow data
-    print("\nConcatenating events:")
-    concat_events = None  # array.array
-    for count, flow_path in enumerate(flow_paths):
-        # read flow data
-        flow_data = fio.FlowData(flow_path)
-        print(
-            f'{count + 1:>{len(str(flow_paths_len))}}/{flow_paths_len}: "{flow_data.name}"'
+    try:
+        transforms = get_transforms(args)
+    except ValueError as err:
+        parser.error(str(err))
+
+    # check if tests are running
+    pytest_running = "PYTEST_CURRENT_TEST" in os.environ
+
+    # get flow file paths
+    flow_path = (
+        os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
+    )
+    time_stamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    concat_path = args.append or os.path.join(
+        flow_path if not pytest_running else r"./tests",
+        f"{os.path.basename(flow_path)}{'_' + time_stamp + '_' if not pytest_running else '_'}concat.fcs",
+    )
+
+    # set warning parameters
+    warnings.formatwarning = min_warning  # category and message
+    warnings.simplefilter("always", UserWarning)  # do repeat
+
+    # verify flow data
+    if args.verify:
+        check_results = verify(
+            path=flow_path, recurse=args.recurse, threads=args.threads
         )
-        flow_chans = flow_data.channels
-        flow_events = flow_data.events  # 1-D array.array of type 'f'
-
-        # limit flow events to consensus channels (by order and count)
-        if not consens_chans == flow_chans:
-            # reshape to 2-D NumPy array of original type
-            flow_events = np.reshape(
-                np.asarray(flow_data.events, dtype=np.dtype(flow_data.events.typecode)),
-                (flow_data.event_count, flow_data.channel_count),
+        for check_path, check_result in check_results.items():
+            print(
+                f'"{os.path.relpath(check_path, flow_path)}": '
+                + {True: "OK", False: "FAILED", None: "no checksum"}[check_result]
             )
-            assert np.array_equal(
-                flow_data.events[: flow_data.channel_count], flow_events[0]
-            ), "First cell differs after transformation."
-            assert np.array_equal(
-                flow_data.events[-flow_data.channel_count :], flow_events[-1]
-            ), "Last cell differs after transformation."
-
-            # remove non-consensus channels from 2-D NumPy array
-            flow_idxs = cons_idxs(flow_chans, consens_chans)
-            flow_events = flow_events[:, flow_idxs]  # matching labels at same positions
-            assert consens_chans == dict(
-                sorted(
-                    {
-                        pos: get_name(chan)
-                        for pos, chan in flow_chans.items()
-                        if pos - 1 in flow_idxs
-                    }.items()
+        if False in check_results.values():
+            sys.exit("Checksums differ")
+        sys.exit(0)
+
+    # concatenate flow data
+    try:
+        concat(
+            path=flow_path,
+            concat_path=concat_path,
+            append=bool(args.append),
+            stream=args.stream,
+            threads=args.threads,
+            cache=args.cache,
+            processes=args.processes,
+            recurse=args.recurse,
+            max_events=args.max_events,
+            max_bytes=args.max_bytes,
+            channels=args.channels,
+            exclude_channels=args.exclude_channels,
+            dtype=args.dtype,
+            confirm=(
+                None
+                if pytest_running
+                else lambda: (
+                    input("\nPlease confirm concatenation [Y/n]: ").strip().lower()
+                    in ("", "y")
                 )
-            ), "Channels do not match consensus."
-
-            # flatten to 1-D array.array of type 'f'
-            flow_events = array.array("f", flow_events.reshape(-1))
-            assert (
-                flow_data.event_count * flow_data.channel_count
-                - flow_data.event_count * (flow_data.channel_count - consens_count)
-                == len(flow_events)
-            ), "Cells missing after transformation."
-
-        # concatenate events
-        if not concat_events:
-            concat_events = array.array(flow_data.events.typecode)  # empty
-        concat_events[len(concat_events) :] = flow_events  # .extend(flow_events)
-
-    event_count = len(concat_events) / consens_count
-    print(f"{event_count:,} events in {consens_count:,} channels\n")
-
-    # write concatenated flow data
-    print("Writing events:")
-    with open(
-        os.path.abspath(concat_path),
-        "wb",
-    ) as concat_file:
-        fio.create_fcs(
-            concat_file,
-            event_data=concat_events,  # cast to array.array('f,) in flowio
-            channel_names=[chan for chan in consens_chans.values()],
+            ),
+            metrics_path=(
+                os.path.splitext(concat_path)[0] + "_metrics.json"
+                if args.metrics
+                else ""
+            ),
+            skip_dups=args.skip_duplicates,
+            transforms=transforms,
         )
-
-    # check concatenated flow data
-    concat_data = fio.FlowData(os.path.abspath(concat_path), only_text=True)
-    print(
-        f'"{concat_data.name}"\n'
-        f"{math.ceil(concat_data.file_size):,} B on disk\n"
-        f"{concat_data.event_count:,} events in {concat_data.channel_count:,} channels\n"
-    )
-    assert event_count == concat_data.event_count, "Event count differs after writing."
-    assert consens_count == concat_data.channel_count, (
-        "Channel count differs after writing."
-    )
-    assert concat_data.file_size > 0, "Concatenated file does not contain any data."
-else:
-    print("No files found.")
+    except ValueError as err:
+        sys.exit(str(err))
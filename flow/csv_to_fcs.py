@@ -20,116 +20,105 @@ URL:        https://github.com/rickert-lab/tools
 Version:    0.2
 """
 
-import json
-import fnmatch
+import argparse
 import os
+import sys
 
-import flowio as fio
-import pandas as pd
+from flowtools import table_to_fcs
+from flowtools.fcs import DATA_TYPES
 
-
-def get_files(path="", pat="*", anti="", recurse=False):
-    """Iterate through all files in a directory structure and
-       return a list of matching files.
-
-    Keyword arguments:
-    path -- the path to a directory containing files (default "")
-    pat -- string pattern that needs to be part of the file name (default "None")
-    anti -- string pattern that may not be part of the file name (default "None")
-    recurse -- boolen that allows the function to work recursively (default "False")
-    """
-    file_list = []
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            file = os.path.join(root, file)
-            if fnmatch.fnmatch(file, pat) and not fnmatch.fnmatch(file, anti):
-                file_list.append(file)
-        if not recurse:
-            break  # from `os.walk()`
-    return file_list
-
-
-# check if tests are running
-pytest_running = "PYTEST_CURRENT_TEST" in os.environ
-
-# get csv file paths
-csv_path = (
-    os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
-)
-
-# collect csv file names
-csv_paths = sorted(
-    get_files(path=os.path.abspath(csv_path), pat="*.csv", anti="*_annots.csv")
-)
-csv_paths_len = len(csv_paths)
-
-
-print("\nConverting files:")
-for count, csv_path in enumerate(csv_paths):
-    print(
-        f'{count + 1:>{len(str(csv_paths_len))}}/{csv_paths_len}: "{os.path.basename(csv_path)}"'
+if __name__ == "__main__":
+    # parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Convert comma-separated value to flow cytometry files."
     )
-
-    # read csv data
-    csv_frame = pd.read_csv(
-        csv_path,
-        sep=r",",
-        header="infer",
-        engine="pyarrow",  # multithreading
-        skip_blank_lines=True,
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="keep file metadata in a JSON file to only convert new or changed files",
     )
+    parser.add_argument(
+        "--recurse",
+        action="store_true",
+        help="include files in subdirectories",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=list(DATA_TYPES),
+        default="float32",
+        help="data type of events, integers are rounded and clipped (default: float32)",
+    )
+    parser.add_argument(
+        "--format",
+        nargs="+",
+        choices=["csv", "parquet", "feather", "arrow"],
+        default=["csv"],
+        help="input file formats, columnar files are always streamed (default: csv)",
+    )
+    parser.add_argument(
+        "--shared-annots",
+        action="store_true",
+        help="encode non-numeric columns of all files with one shared annotation file",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="convert files in record batches to limit memory usage",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=2**20,
+        help="bytes of csv text per record batch with --stream (default: 1 MiB)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="maximum number of files converted in parallel, largest first (default: 1)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=0,
+        help="maximum estimated memory in MiB of files converted in parallel (default: no limit)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="write time and memory per stage and file to JSON and CSV files",
+    )
+    args = parser.parse_args()
 
-    # write annotated csv file
-    if pytest_running:
-        with open(
-            os.path.join(
-                os.path.dirname(csv_path),
-                os.path.splitext(os.path.basename(csv_path))[0] + "_annots.csv",
-            ),
-            "w",
-        ) as csv_file:
-            csv_frame.to_csv(
-                csv_file, header=True, index=False
-            )  # keep header, ignore Pandas' index
-
-    # find non-numeric columns
-    nonum_cols = [
-        col
-        for col in csv_frame.columns
-        if not pd.api.types.is_numeric_dtype(csv_frame[col])  # use numeric annotations
-    ]
-
-    # convert non-numeric to categorical columns
-    for nonum_col in nonum_cols:
-        csv_frame[nonum_col] = csv_frame[nonum_col].astype("category")
+    # check if tests are running
+    pytest_running = "PYTEST_CURRENT_TEST" in os.environ
 
-    # write annotation JSON file
-    annots = {}
-    for nonum_col in nonum_cols:
-        nonum_col_cats = csv_frame[nonum_col].cat.categories  # unique only
-        csv_frame[nonum_col] = csv_frame[nonum_col].cat.codes  # replace all
-        annots[nonum_col] = pd.Series(
-            range(len(nonum_col_cats)), index=nonum_col_cats
-        ).to_dict()  # preserve category order
-    with open(
-        os.path.join(
-            os.path.dirname(csv_path),
-            os.path.splitext(os.path.basename(csv_path))[0] + "_annots.json",
-        ),
-        "w",
-    ) as annot_file:
-        json.dump(annots, annot_file, indent=2)
+    # get csv file paths
+    csv_path = (
+        os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
+    )
 
-    # write fcs file
-    with open(
-        os.path.join(
-            os.path.dirname(csv_path),
-            os.path.splitext(os.path.basename(csv_path))[0] + "_annots.fcs",
-        ),
-        "wb",
-    ) as fcs_file:
-        fio.create_fcs(
-            fcs_file,
-            event_data=csv_frame.to_numpy(dtype="float64").ravel(),
-            channel_names=[col for col in csv_frame.columns],
+    # convert csv files
+    try:
+        table_to_fcs(
+            path=csv_path,
+            in_formats=args.format,
+            cache=args.cache,
+            recurse=args.recurse,
+            keep_csv=pytest_running,
+            dtype=args.dtype,
+            shared_annots=args.shared_annots,
+            stream=args.stream,
+            block_size=args.block_size,
+            processes=args.processes,
+            memory_budget=args.memory_budget * 2**20,
+            metrics_path=(
+                os.path.join(
+                    csv_path, os.path.basename(csv_path) + "_csv_to_fcs_metrics.json"
+                )
+                if args.metrics
+                else ""
+            ),
         )
+    except ValueError as err:
+        sys.exit(str(err))
@@ -20,83 +20,120 @@ URL:        https://github.com/rickert-lab/tools
 Version:    0.2
 """
 
+import argparse
 import os
-import fnmatch
 
-import flowio as fio
-import numpy as np
+from flowtools import fcs_to_table
+from flowtools.transform import add_arguments, get_transforms
 
-
-def get_files(path="", pat="*", anti="", recurse=False):
-    """Iterate through all files in a directory structure and
-       return a list of matching files.
-
-    Keyword arguments:
-    path -- the path to a directory containing files (default "")
-    pat -- string pattern that needs to be part of the file name (default "None")
-    anti -- string pattern that may not be part of the file name (default "None")
-    recurse -- boolen that allows the function to work recursively (default "False")
-    """
-    file_list = []
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            file = os.path.join(root, file)
-            if fnmatch.fnmatch(file, pat) and not fnmatch.fnmatch(file, anti):
-                file_list.append(file)
-        if not recurse:
-            break  # from `os.walk()`
-    return file_list
-
-
-def get_name(channel):
-    """Get channel label from flowio channel dictionary.
-    Try to retrieve the optional long name first and
-    if that fails try to get the short name.
-
-    Keyword arguments:
-    channels - the flowio channel dictionary
-    """
-    return (
-        channel.get("pns") or channel["pnn"]
-    )  # 'pns' value must be True, i.e. it must differ from "", None, False
-
-
-# check if tests are running
-pytest_running = "PYTEST_CURRENT_TEST" in os.environ
-
-# get fcs file paths
-fcs_path = (
-    os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
-)
-
-# collect fcs file names
-fcs_paths = sorted(get_files(path=os.path.abspath(fcs_path), pat="*.fcs", anti=""))
-fcs_paths_len = len(fcs_paths)
-
-print("\nConverting files:")
-for count, fcs_path in enumerate(fcs_paths):
-    print(
-        f'{count + 1:>{len(str(fcs_paths_len))}}/{fcs_paths_len}: "{os.path.basename(fcs_path)}"'
+if __name__ == "__main__":
+    # parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Convert flow cytometry to comma-separated value files."
     )
-
-    # read fcs data
-    fcs_data = fio.FlowData(fcs_path)
-    fcs_chans = [get_name(chan) for chan in fcs_data.channels.values()]
-
-    # reshape fcs data
-    fcs_events = np.reshape(
-        np.asarray(fcs_data.events, dtype=np.dtype(fcs_data.events.typecode)),
-        (fcs_data.event_count, fcs_data.channel_count),
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="keep file metadata in a JSON file to only convert new or changed files",
+    )
+    parser.add_argument(
+        "--recurse",
+        action="store_true",
+        help="include files in subdirectories",
+    )
+    parser.add_argument(
+        "--digits",
+        type=int,
+        default=0,
+        help="round values to this many significant digits (default: exact)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "feather", "arrow"],
+        default="csv",
+        help="output file format (default: csv)",
+    )
+    parser.add_argument(
+        "--compression",
+        default=None,
+        help="compression codec for parquet (default: snappy) or feather/arrow files",
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=2**20,
+        help="events per row group or record batch in parquet or feather/arrow files",
+    )
+    parser.add_argument(
+        "--channels",
+        nargs="+",
+        default=None,
+        help="only keep channels matching these names or patterns (pnn or pns)",
+    )
+    parser.add_argument(
+        "--exclude-channels",
+        nargs="+",
+        default=None,
+        help="drop channels matching these names or patterns (pnn or pns)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=2**16,
+        help="events read and written at a time in csv files (default: 65536)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="maximum number of files converted in parallel, largest first (default: 1)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=0,
+        help="maximum file size in MiB converted in parallel (default: no limit)",
+    )
+    add_arguments(parser)  # compensation and transforms
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="write time and memory per stage and file to JSON and CSV files",
+    )
+    args = parser.parse_args()
+    try:
+        transforms = get_transforms(args)
+    except ValueError as err:
+        parser.error(str(err))
+
+    # check if tests are running
+    pytest_running = "PYTEST_CURRENT_TEST" in os.environ
+
+    # get fcs file paths
+    fcs_path = (
+        os.path.abspath(r"./") if not pytest_running else os.path.abspath(r"./tests/")
     )
 
-    # write csv data
-    with open(
-        os.path.join(
-            os.path.dirname(fcs_path),
-            os.path.splitext(os.path.basename(fcs_path))[0] + ".csv",
+    # convert fcs files
+    fcs_to_table(
+        path=fcs_path,
+        out_format=args.format,
+        cache=args.cache,
+        recurse=args.recurse,
+        digits=args.digits,
+        compression=args.compression,
+        row_group_size=args.row_group_size,
+        channels=args.channels,
+        exclude_channels=args.exclude_channels,
+        chunk_size=args.chunk_size,
+        processes=args.processes,
+        memory_budget=args.memory_budget * 2**20,
+        metrics_path=(
+            os.path.join(
+                fcs_path, os.path.basename(fcs_path) + "_fcs_to_csv_metrics.json"
+            )
+            if args.metrics
+            else ""
         ),
-        "w",
-    ) as csv_file:
-        np.savetxt(
-            csv_file, fcs_events, delimiter=",", header=",".join(fcs_chans), comments=""
-        )
+        transforms=transforms,
+    )
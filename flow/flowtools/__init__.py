@@ -0,0 +1,51 @@
+"""
+flowtools - concatenate and convert flow cytometry files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import importlib
+
+
+def __dir__():
+    return sorted(list(globals()) + list(LAZY_FUNCS))
+
+
+def __getattr__(name):
+    """Import the module of a public function on first access, so that
+       importing the package does not load NumPy, pandas or PyArrow.
+
+    Keyword arguments:
+    name -- the name of the requested attribute
+    """
+    if name in LAZY_FUNCS:
+        return getattr(importlib.import_module(LAZY_FUNCS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# set modules of public functions
+LAZY_FUNCS = {
+    "concat": ".concatenate",
+    "fcs_to_table": ".to_table",
+    "read_fcs": ".fcs",
+    "table_to_fcs": ".to_fcs",
+    "verify": ".checksum",
+}
+
+__all__ = list(LAZY_FUNCS)
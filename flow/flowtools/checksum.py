@@ -0,0 +1,101 @@
+"""
+flowtools.checksum - verify checksums of flow cytometry files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import concurrent.futures
+import json
+import os
+
+from .fcs import CHECKSUM_KEY, chain_hash, hash_data, read_text
+from .files import get_files
+
+
+def check_file(flow_path):
+    """Check the DATA segment of a flow cytometry file against its checksum
+       without decoding events.
+    Return "True" if the checksum in TEXT, and in the JSON file next to
+    the file if present, matches the DATA segment, "False" if not and
+    "None" if the file has no checksum. Segments of appended events listed
+    in the JSON file are hashed in a chain as by chain_hash.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    """
+    flow_text = read_text(flow_path)
+    checksum = flow_text.get(CHECKSUM_KEY.lower())
+    if not checksum:
+        return None
+    data_start, data_end = int(flow_text["begindata"]), int(flow_text["enddata"])
+    chan_bits = sum(
+        int(flow_text[f"p{pos}b"]) for pos in range(1, int(flow_text["par"]) + 1)
+    )
+    if (
+        data_end - data_start + 1 != int(flow_text["tot"]) * chan_bits // 8
+        or data_end >= os.path.getsize(flow_path)  # truncated file
+    ):
+        return False
+    segments = [int(flow_text["tot"])]  # events per write
+    sum_path = os.path.splitext(flow_path)[0] + "_checksum.json"
+    if os.path.exists(sum_path):
+        with open(sum_path, "r", encoding="utf-8") as sum_file:
+            flow_sum = json.load(sum_file)
+        if flow_sum["checksum"] != checksum:
+            return False
+        segments = flow_sum.get("segments", segments)
+        if sum(segments) != int(flow_text["tot"]):
+            return False
+    data_hash = None
+    with open(flow_path, "rb") as flow_file:
+        for segment in segments:
+            if data_hash is not None:
+                data_hash = chain_hash(data_hash.hexdigest())
+            segment_end = data_start + segment * chan_bits // 8
+            data_hash = hash_data(flow_file, data_start, segment_end - 1, data_hash)
+            data_start = segment_end
+    return data_hash.hexdigest() == checksum
+
+
+def verify(paths=None, path="", recurse=False, threads=None):
+    """Check flow cytometry files against their checksums in parallel
+       and return a dictionary of results by file path.
+    Results are "True" for matching, "False" for differing and "None"
+    for files without checksum. Files are hashed in threads, since
+    hashing releases the global interpreter lock.
+
+    Keyword arguments:
+    paths -- list of paths to flow cytometry files, all in path if "None" (default "None")
+    path -- the path to a directory containing files (default "")
+    recurse -- include files in subdirectories of path (default "False")
+    threads -- maximum number of files checked in parallel (default "None")
+    """
+    if paths is None:
+        flow_paths = sorted(
+            get_files(
+                path=os.path.abspath(path or os.curdir),
+                pat="*.fcs",
+                recurse=recurse,
+                threads=threads,
+            )
+        )
+    else:
+        flow_paths = [os.path.abspath(flow_path) for flow_path in paths]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return dict(zip(flow_paths, executor.map(check_file, flow_paths)))
@@ -0,0 +1,950 @@
+"""
+flowtools.concatenate - concatenate flow cytometry files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+from datetime import datetime
+
+from .fcs import (
+    BYTE_ORDER,
+    CHECKSUM_KEY,
+    CHECKSUM_NULL,
+    CHECKSUM_SIZE,
+    DATA_TYPES,
+    TEXT_START,
+    cache_text,
+    cast_events,
+    chain_hash,
+    get_chans,
+    get_fingerprint,
+    get_name,
+    get_text,
+    hash_data,
+    read_events,
+    read_text,
+    select_chans,
+    write_checksum,
+    write_fcs,
+    write_head,
+)
+from .files import get_files, load_cache, save_cache
+from .metrics import measure, write_metrics
+from .transform import apply_steps, get_steps
+
+
+def concat(
+    paths=None,
+    path="",
+    concat_path="",
+    append=False,
+    stream=False,
+    threads=None,
+    cache=False,
+    processes=1,
+    recurse=False,
+    max_events=0,
+    max_bytes=0,
+    channels=None,
+    exclude_channels=None,
+    dtype=None,
+    confirm=None,
+    metrics_path="",
+    skip_dups=False,
+    transforms=None,
+):
+    """Concatenate the events of flow cytometry files in their consensus channels
+       and return the paths to the written files.
+    Channels at the same position and with the same name in all files are kept,
+    others are removed after confirmation. Files with the same events as
+    another file, or as a source of the file appended to, are reported as
+    duplicates and skipped on request.
+    Events are optionally compensated and transformed per file while reading.
+
+    Keyword arguments:
+    paths -- list of paths to flow cytometry files, all in path if "None" (default "None")
+    path -- the path to a directory containing files and the cache (default "")
+    concat_path -- the path to the concatenated file, time-stamped if empty (default "")
+    append -- add new files to a concatenated file written with stream (default "False")
+    stream -- write events to disk while reading files (default "False")
+    threads -- maximum number of files read in parallel when checking channels (default "None")
+    cache -- keep file metadata in a JSON file in path (default "False")
+    processes -- maximum number of files read and filtered in parallel (default 1)
+    recurse -- include files in subdirectories of path (default "False")
+    max_events -- split output into files with at most this many events (default 0)
+    max_bytes -- split output into files of at most this many bytes (default 0)
+    channels -- list of consensus channel names or patterns to keep (default "None")
+    exclude_channels -- list of consensus channel names or patterns to drop (default "None")
+    dtype -- NumPy data type of the events, "None" for float32 or as appended (default "None")
+    confirm -- function returning "False" to cancel removing channels (default "None")
+    metrics_path -- the path to a JSON file for stage metrics, none if empty (default "")
+    skip_dups -- skip files duplicating an earlier file (default "False")
+    transforms -- keyword arguments of get_steps, none if "None" (default "None")
+    """
+    metrics = [] if metrics_path else None
+    shard = bool(max_events or max_bytes)
+    out_dtype = dtype or "float32"
+    stream = stream or append or shard
+    if append and shard:
+        raise ValueError("append cannot be combined with max_events or max_bytes")
+    if append and (channels or exclude_channels):
+        raise ValueError("append cannot be combined with channels or exclude_channels")
+
+    # get flow file paths
+    flow_path = os.path.abspath(path or os.curdir)
+    if not concat_path:
+        time_stamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+        concat_path = os.path.join(
+            flow_path, f"{os.path.basename(flow_path)}_{time_stamp}_concat.fcs"
+        )
+    sources_path = os.path.splitext(concat_path)[0] + "_sources.json"
+    sum_path = os.path.splitext(concat_path)[0] + "_checksum.json"
+    manifest_path = os.path.splitext(concat_path)[0] + "_manifest.json"
+    cache_path = os.path.join(flow_path, ".concat_fcs_cache.json")
+
+    # collect channels from flow data
+    with measure(metrics, "discover"):
+        if paths is None:
+            flow_stats = get_files(
+                path=flow_path,
+                pat="*.fcs",
+                anti="*_concat.fcs",
+                recurse=recurse,
+                threads=threads,
+            )
+            flow_paths = sorted(
+                flow_path
+                for flow_path in flow_stats
+                if not fnmatch.fnmatch(
+                    os.path.basename(flow_path), "*_concat_part[0-9][0-9][0-9][0-9].fcs"
+                )
+            )
+        else:
+            flow_paths = [os.path.abspath(flow_path) for flow_path in paths]
+            flow_stats = {flow_path: os.stat(flow_path) for flow_path in flow_paths}
+    concat_sources = {}  # {file: {'events': int, 'fingerprint': str, 'layout': str}}
+    concat_prints = {}  # {fingerprint: file}
+    concat_text = {}  # TEXT keywords
+    concat_chans = {}  # {pos: name} of source files
+    if append:
+        # check layout of concatenated file
+        concat_name = os.path.basename(concat_path)
+        if not os.path.isfile(concat_path):
+            raise ValueError(f'"{concat_name}" not found')
+        concat_text = read_text(concat_path)
+        out_dtype = {
+            (DATA_TYPES[key], np.dtype(key).itemsize * 8): key for key in DATA_TYPES
+        }.get((concat_text.get("datatype"), int(concat_text.get("p1b", 0))), out_dtype)
+        if dtype and dtype != out_dtype:
+            raise ValueError(f'"{concat_name}" not written with --dtype {dtype}')
+        chan_names, text_items = get_labels(
+            concat_text,
+            {pos: get_name(chan) for pos, chan in get_chans(concat_text).items()},
+            out_dtype,
+        )
+        if CHECKSUM_KEY.lower() in concat_text:  # older files
+            text_items[CHECKSUM_KEY] = CHECKSUM_NULL
+        if (
+            not os.path.isfile(sources_path)
+            or int(concat_text.get("begindata", 0))
+            != TEXT_START
+            + len(get_text(chan_names, dtype=out_dtype, text_items=text_items))
+            or concat_text.get("datatype") != DATA_TYPES[out_dtype]
+            or concat_text.get("byteord") != BYTE_ORDER
+        ):
+            raise ValueError(f'"{concat_name}" not written with --stream')
+
+        # skip files already included
+        with open(sources_path, "r", encoding="utf-8") as sources_file:
+            concat_sources = json.load(sources_file)
+        if "files" in concat_sources:
+            concat_chans = {
+                int(pos): name for pos, name in concat_sources["channels"].items()
+            }  # positions in source files
+            concat_sources = concat_sources["files"]
+        else:  # older files
+            concat_chans = {
+                pos: get_name(chan) for pos, chan in get_chans(concat_text).items()
+            }
+        concat_prints = {
+            source["fingerprint"]: source_name
+            for source_name, source in concat_sources.items()
+            if isinstance(source, dict) and source.get("fingerprint")
+        }  # not in older files
+        flow_paths = [
+            flow_path
+            for flow_path in flow_paths
+            if os.path.relpath(flow_path, os.path.dirname(os.path.abspath(concat_path)))
+            not in concat_sources
+        ]
+    flow_paths_len = len(flow_paths)
+    if not flow_paths_len:
+        print("No new files found." if append else "No files found.")
+        return []
+
+    print("Checking channels:")
+    pos_data = {  # {pos: {'name': str, 'count': int}}
+        pos: {"name": name, "count": 0} for pos, name in concat_chans.items()
+    }
+    flow_cache = load_cache(cache_path) if cache else {}
+    flow_texts = []  # TEXT keywords
+    with measure(metrics, "parse_text"):
+        for count, (flow_path, flow_text) in enumerate(
+            zip(
+                flow_paths,
+                scan_text(
+                    flow_paths,
+                    threads=threads,
+                    cache=flow_cache,
+                    cache_root=os.path.dirname(cache_path),
+                    flow_stats=flow_stats,
+                ),
+            )
+        ):
+            # print progress
+            if not (count + 1) % 100 or count == 0 or (count + 1) == flow_paths_len:
+                print(f"{count + 1}", end="", flush=True)
+            else:
+                print(".", end="", flush=True)
+            flow_texts.append(flow_text)
+
+    # find duplicate acquisitions
+    with measure(metrics, "fingerprint"):
+        if append:
+            fingerprint_sources(
+                concat_sources,
+                concat_prints,
+                {get_layout_key(flow_text) for flow_text in flow_texts},
+                os.path.dirname(os.path.abspath(concat_path)),
+                threads,
+            )  # earlier files sharing a layout with new files
+        flow_dups = find_dups(
+            flow_paths,
+            flow_texts,
+            threads=threads,
+            cache=flow_cache,
+            cache_root=os.path.dirname(cache_path),
+            flow_prints=concat_prints,
+        )
+    for dup_path, orig_path in flow_dups.items():
+        warnings.warn(
+            f'"{os.path.basename(dup_path)}" duplicates "{os.path.basename(orig_path)}"'
+            + (", skipping" if skip_dups else "")
+        )
+    if skip_dups and flow_dups:
+        flow_texts = [
+            text for path, text in zip(flow_paths, flow_texts) if path not in flow_dups
+        ]
+        flow_paths = [path for path in flow_paths if path not in flow_dups]
+        flow_paths_len = len(flow_paths)
+
+    # track channel positions and names
+    for flow_path, flow_text in zip(flow_paths, flow_texts):
+        for pos, chan in get_chans(flow_text).items():
+            chan_name = get_name(chan)
+            if pos not in pos_data:
+                pos_data[pos] = {"name": chan_name, "count": 0}
+            if pos_data[pos]["name"] == chan_name:
+                pos_data[pos]["count"] += 1
+            else:
+                warnings.warn(
+                    f'"{os.path.basename(flow_path)}" @{pos} = "{chan["pnn"]}"'
+                )
+
+    if cache:
+        save_cache(cache_path, flow_cache)
+
+    # separate consensus from non-consensus channels
+    if append:
+        # keep channels of concatenated file
+        consens_chans = concat_chans
+        flow_keeps = [
+            len(cons_idxs(get_chans(flow_text), consens_chans)) == len(consens_chans)
+            for flow_text in flow_texts
+        ]
+        for flow_path, flow_keep in zip(flow_paths, flow_keeps):
+            if not flow_keep:
+                warnings.warn(
+                    f'"{os.path.basename(flow_path)}" is missing consensus channels'
+                )
+        flow_paths = [path for path, keep in zip(flow_paths, flow_keeps) if keep]
+        flow_texts = [text for text, keep in zip(flow_texts, flow_keeps) if keep]
+        flow_paths_len = len(flow_paths)
+    else:
+        consens_chans = {
+            pos: data["name"]
+            for pos, data in pos_data.items()
+            if data["count"] == flow_paths_len
+        }
+    nonsens_chans = {
+        pos: data["name"]
+        for pos, data in pos_data.items()
+        if consens_chans.get(pos) != data["name"]
+    }
+
+    # select consensus channels, if requested
+    if channels or exclude_channels:
+        select_poss = select_chans(
+            {
+                pos: chan
+                for pos, chan in get_chans(flow_texts[0]).items()
+                if pos in consens_chans  # same names in all files
+            },
+            channels,
+            exclude_channels,
+        )
+        consens_chans = {
+            pos: consens_chans[pos] for pos in consens_chans if pos in select_poss
+        }
+        if not consens_chans:
+            raise ValueError("No consensus channels selected")
+    consens_count = len(consens_chans)
+
+    print(f"\nRemoving channels:\n{nonsens_chans}")
+    print(f"\nKeeping channels:\n{consens_chans}")
+
+    # confirm processing
+    if nonsens_chans and confirm and not confirm():
+        return []  # quit without error
+
+    # process flow data
+    print("\nConcatenating events:")
+    concat_blocks = []  # events in output data type
+    event_count = 0
+    if not append:  # labels of concatenated file
+        chan_names, text_items = get_labels(flow_texts[0], consens_chans, out_dtype)
+    checksum = not append or CHECKSUM_KEY.lower() in concat_text  # older files
+    if checksum:
+        text_items[CHECKSUM_KEY] = CHECKSUM_NULL  # hashed while writing
+    if shard:
+        # limit events per file
+        max_events = min(
+            max_events or sys.maxsize,
+            (
+                (
+                    max_bytes
+                    - TEXT_START
+                    - len(get_text(chan_names, dtype=out_dtype, text_items=text_items))
+                )
+                // (consens_count * np.dtype(out_dtype).itemsize)
+                if max_bytes
+                else sys.maxsize
+            ),
+        )
+        max_events = max(max_events, 1)  # no empty files
+    concat_manifest = {}  # {shard: [{'file': str, 'start': int, 'stop': int}]}
+    concat_counts = {}  # {file: events}
+    concat_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+    concat_segments = []  # events per write, hashed in a chain
+    shard_paths = []
+    shard_file = None
+    shard_count = 0
+    with (
+        (
+            open(os.path.abspath(concat_path), "r+b" if append else "wb")
+            if stream and not shard
+            else contextlib.nullcontext()
+        ) as concat_file,
+        contextlib.ExitStack() as shard_stack,  # closes shards on errors
+    ):
+        if append:
+            # skip to end of events
+            data_start = int(concat_text["begindata"])  # checked layout
+            event_count = int(concat_text["tot"])
+            data_end = (
+                data_start + event_count * consens_count * np.dtype(out_dtype).itemsize
+            )
+            if checksum:
+                # continue hashing after the events of earlier writes
+                concat_sum = {}
+                if os.path.isfile(sum_path):
+                    with open(sum_path, "r", encoding="utf-8") as sum_file:
+                        concat_sum = json.load(sum_file)
+                if (
+                    concat_sum.get("checksum") == concat_text[CHECKSUM_KEY.lower()]
+                    and concat_sum.get("events") == event_count
+                ):
+                    concat_segments = concat_sum.get("segments", [event_count])
+                    concat_hash = chain_hash(concat_sum["checksum"])
+                else:  # older files
+                    concat_segments = [event_count]
+                    concat_hash = chain_hash(
+                        hash_data(concat_file, data_start, data_end - 1).hexdigest()
+                    )
+            concat_file.seek(data_end)
+            concat_file.truncate()  # incomplete appends
+        elif stream and not shard:
+            # reserve space for HEADER and TEXT
+            write_head(concat_file, chan_names, dtype=out_dtype, text_items=text_items)
+        for count, (flow_path, flow_events) in enumerate(
+            zip(
+                flow_paths,
+                load_events(
+                    flow_paths,
+                    flow_texts,
+                    consens_chans,
+                    processes=processes,
+                    dump_dir=os.path.dirname(os.path.abspath(concat_path)),
+                    dtype=out_dtype,
+                    metrics=metrics,
+                    transforms=transforms,
+                ),
+            )
+        ):
+            # read flow data
+            print(
+                f'{count + 1:>{len(str(flow_paths_len))}}/{flow_paths_len}: "{os.path.basename(flow_path)}"'
+            )
+
+            with measure(metrics, "write", flow_path) as write_record:
+                write_record["events"] = len(flow_events)
+                write_record["bytes_written"] = flow_events.nbytes
+
+                # split events into files
+                if shard:
+                    start = 0
+                    while start < len(flow_events):
+                        if shard_file is None or shard_count == max_events:
+                            shard_paths.append(
+                                f"{os.path.splitext(concat_path)[0]}_part{len(shard_paths) + 1:04d}.fcs"
+                            )
+                            shard_file = shard_stack.enter_context(
+                                open_shard(
+                                    shard_paths[-1],
+                                    chan_names,
+                                    shard_file,
+                                    shard_count,
+                                    out_dtype,
+                                    text_items,
+                                    concat_hash,
+                                )
+                            )
+                            concat_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+                            shard_count = 0
+                            concat_manifest[os.path.basename(shard_paths[-1])] = []
+                        stop = min(len(flow_events), start + max_events - shard_count)
+                        flow_events[start:stop].tofile(shard_file)
+                        concat_hash.update(flow_events[start:stop])
+                        concat_manifest[os.path.basename(shard_paths[-1])].append(
+                            {
+                                "file": os.path.relpath(
+                                    flow_path,
+                                    os.path.dirname(os.path.abspath(concat_path)),
+                                ),
+                                "start": start,
+                                "stop": stop,  # exclusive
+                            }
+                        )
+                        shard_count += stop - start
+                        concat_counts[shard_paths[-1]] = shard_count
+                        start = stop
+                    event_count += len(flow_events)
+                    continue
+
+                # write events
+                if stream:
+                    flow_events.tofile(concat_file)  # native byte order
+                    if checksum:
+                        concat_hash.update(flow_events)
+                    event_count += len(flow_events)
+                    concat_sources[
+                        os.path.relpath(
+                            flow_path, os.path.dirname(os.path.abspath(concat_path))
+                        )
+                    ] = {
+                        "events": len(flow_events),
+                        "fingerprint": flow_cache.get(
+                            os.path.relpath(flow_path, os.path.dirname(cache_path)),
+                            {},
+                        ).get("fingerprint"),  # of candidates only
+                        "layout": get_layout_key(flow_texts[count]),
+                    }  # detect later duplicates
+                    continue
+
+                # collect events, copy views to release memory maps
+                concat_blocks.append(
+                    flow_events if flow_events.flags.owndata else np.array(flow_events)
+                )
+                event_count += len(flow_events)
+
+        with measure(metrics, "finalize", concat_path):
+            if shard:
+                # finalize last file
+                open_shard(
+                    None,
+                    chan_names,
+                    shard_file,
+                    shard_count,
+                    out_dtype,
+                    text_items,
+                    concat_hash,
+                )
+
+                # record source files and events
+                with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+                    json.dump(concat_manifest, manifest_file, indent=2)
+            elif stream:
+                # finalize HEADER and TEXT
+                if checksum:
+                    text_items[CHECKSUM_KEY] = concat_hash.hexdigest()
+                    concat_segments.append(event_count - sum(concat_segments))
+                    write_checksum(
+                        concat_path, concat_hash, event_count, concat_segments
+                    )
+                write_head(concat_file, chan_names, event_count, out_dtype, text_items)
+                concat_counts[concat_path] = event_count
+
+                # record source files
+                with open(sources_path, "w", encoding="utf-8") as sources_file:
+                    json.dump(
+                        {"channels": consens_chans, "files": concat_sources},
+                        sources_file,
+                        indent=2,
+                    )
+    print(f"{event_count:,} events in {consens_count:,} channels\n")
+
+    # write concatenated flow data
+    if not stream:
+        print("Writing events:")
+        with measure(metrics, "finalize", concat_path) as write_record:
+            write_record["events"] = write_fcs(
+                os.path.abspath(concat_path),
+                chan_names,
+                concat_blocks,
+                out_dtype,
+                text_items,
+                checksum=True,
+            )
+            write_record["bytes_written"] = os.path.getsize(concat_path)
+            concat_counts[concat_path] = write_record["events"]
+
+    # check concatenated flow data without reading it back
+    data_start = TEXT_START + len(
+        get_text(chan_names, dtype=out_dtype, text_items=text_items)
+    )
+    with measure(metrics, "check"):
+        concat_paths = shard_paths if shard else [concat_path]
+        for concat_path in concat_paths:
+            concat_size = os.path.getsize(concat_path)
+            print(
+                f'"{os.path.basename(concat_path)}"\n'
+                f"{concat_size:,} B on disk\n"
+                f"{concat_counts[concat_path]:,} events in {consens_count:,} channels\n"
+            )
+            assert (
+                concat_size
+                == data_start
+                + concat_counts[concat_path]
+                * consens_count
+                * np.dtype(out_dtype).itemsize
+            ), "File size differs after writing."
+    assert event_count == sum(concat_counts.values()), (
+        "Event count differs after writing."
+    )
+    if metrics is not None:
+        write_metrics(metrics_path, metrics)
+    return concat_paths
+
+
+def cons_idxs(flow_chans, consens_chans):
+    """Return the indices of all flow channels matchting the consensus channels by index and name.
+
+    Keyword arguments:
+    flow_chans -- FlowIO channel dictionary
+    consens_chans -- consensus channel dictionary
+    """
+    return sorted(
+        [
+            pos - 1  # integer
+            for pos, chan in flow_chans.items()
+            if pos in consens_chans and get_name(chan) == consens_chans[pos]
+        ]
+    )
+
+
+def dump_events(
+    flow_path,
+    flow_text,
+    consens_chans,
+    dump_dir=None,
+    dtype="float32",
+    transforms=None,
+):
+    """Read the flow events limited to the consensus channels and write them
+       to a temporary file in native byte order.
+    Return the path to the temporary file and the number of events.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary
+    consens_chans -- consensus channel dictionary
+    dump_dir -- the path to the directory for temporary files (default "None")
+    dtype -- NumPy data type of the event values (default "float32")
+    transforms -- keyword arguments of get_steps, none if "None" (default "None")
+    """
+    flow_events = read_events(flow_path, flow_text)
+    if transforms:
+        flow_events = apply_steps(
+            flow_events, get_steps(flow_path, flow_text, **transforms)
+        )
+    flow_events = filter_events(flow_events, get_chans(flow_text), consens_chans, dtype)
+    with tempfile.NamedTemporaryFile(
+        suffix=".events", dir=dump_dir, delete=False
+    ) as dump_file:
+        flow_events.tofile(dump_file)
+    return dump_file.name, len(flow_events)
+
+
+def filter_events(flow_events, flow_chans, consens_chans, dtype="float32"):
+    """Return the flow events limited to the consensus channels as a 2-D array.
+
+    Keyword arguments:
+    flow_events -- 2-D NumPy array of events
+    flow_chans -- channel dictionary
+    consens_chans -- consensus channel dictionary
+    dtype -- NumPy data type of the event values (default "float32")
+    """
+    event_count = flow_events.shape[0]
+    consens_count = len(consens_chans)
+
+    # limit flow events to consensus channels (by order and count)
+    flow_idxs = cons_idxs(flow_chans, consens_chans)
+    if flow_idxs != list(range(flow_events.shape[1])):
+        # copy matching columns only
+        flow_events = flow_events[:, flow_idxs]  # matching labels at same positions
+    assert consens_chans == dict(
+        sorted(
+            {
+                pos: get_name(chan)
+                for pos, chan in flow_chans.items()
+                if pos - 1 in flow_idxs
+            }.items()
+        )
+    ), "Channels do not match consensus."
+    assert flow_events.shape == (event_count, consens_count), (
+        "Cells missing after transformation."
+    )
+
+    # convert to native output type, if necessary
+    return cast_events(flow_events, dtype)
+
+
+def find_dups(
+    flow_paths, flow_texts, threads=None, cache=None, cache_root="", flow_prints=None
+):
+    """Find flow cytometry files with the same events as an earlier file and
+       return a dictionary of the earlier files by duplicate file path.
+    Only files sharing event count, channel count, data type and DATA size
+    with another file, or event count, channel count and data type with
+    a known fingerprint, are fingerprinted, in parallel, and fingerprints
+    are kept in the metadata cache entries of unchanged files.
+
+    Keyword arguments:
+    flow_paths -- list of paths to flow cytometry files
+    flow_texts -- list of TEXT keyword dictionaries
+    threads -- maximum number of files fingerprinted in parallel (default "None")
+    cache -- metadata cache dictionary, updated in place (default "None")
+    cache_root -- the path to the directory containing the cache (default "")
+    flow_prints -- paths to earlier files by fingerprint, e.g. sources (default "None")
+    """
+    cache = {} if cache is None else cache
+    flow_prints = flow_prints or {}
+    print_layouts = {flow_print.rpartition("/")[0] for flow_print in flow_prints}
+    flow_groups = collections.defaultdict(list)  # {layout: [(path, text)]}
+    for flow_path, flow_text in zip(flow_paths, flow_texts):
+        data_size = int(flow_text.get("enddata", "").strip() or 0) - int(
+            flow_text.get("begindata", "").strip() or 0
+        )
+        flow_groups[
+            (
+                flow_text.get("tot", ""),
+                flow_text["par"],
+                flow_text.get("datatype", ""),
+                data_size,
+            )
+        ].append((flow_path, flow_text))
+    dup_items = [  # candidates only
+        item
+        for group_key, group in flow_groups.items()
+        if len(group) > 1 or "/".join(group_key[:3]) in print_layouts
+        for item in group
+    ]
+
+    flow_dups = {}
+    flow_origs = dict(flow_prints)  # {fingerprint: path}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        for (flow_path, _), flow_print in zip(
+            dup_items,
+            executor.map(lambda item: get_print(*item, cache, cache_root), dup_items),
+        ):
+            if flow_print is None:
+                continue
+            if flow_print in flow_origs:
+                flow_dups[flow_path] = flow_origs[flow_print]
+            else:
+                flow_origs[flow_print] = flow_path
+    return {
+        flow_path: flow_dups[flow_path]
+        for flow_path in flow_paths
+        if flow_path in flow_dups
+    }  # in order of the file paths
+
+
+def fingerprint_sources(
+    concat_sources, concat_prints, flow_layouts, concat_dir="", threads=None
+):
+    """Fingerprint earlier source files of a concatenated file in parallel
+       if they share a layout with new files and were not fingerprinted yet.
+    Sources and their paths by fingerprint are updated in place, sources
+    no longer on disk are skipped.
+
+    Keyword arguments:
+    concat_sources -- source file records by path relative to concat_dir
+    concat_prints -- paths to source files by fingerprint
+    flow_layouts -- set of layouts of new files as by get_layout_key
+    concat_dir -- the path to the directory containing the concatenated file (default "")
+    threads -- maximum number of files fingerprinted in parallel (default "None")
+    """
+    source_names = [
+        source_name
+        for source_name, source in concat_sources.items()
+        if isinstance(source, dict)  # not in older files
+        and not source.get("fingerprint")
+        and source.get("layout") in flow_layouts
+        and os.path.isfile(os.path.join(concat_dir, source_name))
+    ]
+
+    def read_print(source_name):
+        source_path = os.path.join(concat_dir, source_name)
+        return get_fingerprint(source_path, read_text(source_path))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        for source_name, source_print in zip(
+            source_names, executor.map(read_print, source_names)
+        ):
+            concat_sources[source_name]["fingerprint"] = source_print
+            if source_print:
+                concat_prints[source_print] = source_name
+
+
+def get_print(flow_path, flow_text, cache=None, cache_root=""):
+    """Return the fingerprint of a flow cytometry file from the metadata cache,
+       fingerprinting the file only once per cache entry.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary
+    cache -- metadata cache dictionary, updated in place (default "None")
+    cache_root -- the path to the directory containing the cache (default "")
+    """
+    cache_entry = (cache or {}).get(os.path.relpath(flow_path, cache_root), {})
+    if "fingerprint" not in cache_entry:  # refreshed with TEXT
+        cache_entry["fingerprint"] = get_fingerprint(flow_path, flow_text)
+    return cache_entry["fingerprint"]
+
+
+def get_labels(flow_text, consens_chans, dtype="float32"):
+    """Return the 'pnn' labels of the consensus channels in a flow cytometry file
+       and their 'pns' labels and 'pnr' ranges as TEXT keywords for writing.
+    Ranges are only kept for floating-point values, integer values are written
+    with the full range of their data type.
+
+    Keyword arguments:
+    flow_text -- TEXT keyword dictionary
+    consens_chans -- consensus channel dictionary
+    dtype -- NumPy data type of the event values (default "float32")
+    """
+    chan_names = []
+    text_items = {}
+    for out_pos, pos in enumerate(consens_chans, start=1):
+        chan_names.append(flow_text[f"p{pos}n"])
+        if flow_text.get(f"p{pos}s"):  # optional
+            text_items[f"$P{out_pos}S"] = flow_text[f"p{pos}s"]
+        if DATA_TYPES[dtype] != "I" and flow_text.get(f"p{pos}r"):
+            text_items[f"$P{out_pos}R"] = flow_text[f"p{pos}r"]
+    return chan_names, text_items
+
+
+def get_layout_key(flow_text):
+    """Return the event count, channel count and data type of a flow cytometry
+       file as the leading part of its fingerprint.
+
+    Keyword arguments:
+    flow_text -- TEXT keyword dictionary
+    """
+    return "/".join(
+        (flow_text.get("tot", ""), flow_text["par"], flow_text.get("datatype", ""))
+    )
+
+
+def load_events(
+    flow_paths,
+    flow_texts,
+    consens_chans,
+    processes=1,
+    dump_dir=None,
+    dtype="float32",
+    metrics=None,
+    transforms=None,
+):
+    """Read the flow events limited to the consensus channels
+       and yield them as 2-D arrays in order of the file paths.
+    With more than one process, files are read in parallel and
+    handed back through temporary files, reading and filtering
+    are then measured together as loading. Compensation and
+    transforms are measured with filtering.
+
+    Keyword arguments:
+    flow_paths -- list of paths to flow cytometry files
+    flow_texts -- list of TEXT keyword dictionaries
+    consens_chans -- consensus channel dictionary
+    processes -- maximum number of files read in parallel (default 1)
+    dump_dir -- the path to the directory for temporary files (default "None")
+    dtype -- NumPy data type of the event values (default "float32")
+    metrics -- list of stage records, "None" to disable measuring (default "None")
+    transforms -- keyword arguments of get_steps, none if "None" (default "None")
+    """
+    if processes < 2:
+        for flow_path, flow_text in zip(flow_paths, flow_texts):
+            with measure(metrics, "decode", flow_path) as read_record:
+                flow_events = read_events(flow_path, flow_text)  # mapped lazily
+                read_record["events"] = len(flow_events)
+                read_record["bytes_read"] = os.path.getsize(flow_path)
+            with measure(metrics, "filter", flow_path) as filter_record:
+                if transforms:
+                    flow_events = apply_steps(
+                        flow_events, get_steps(flow_path, flow_text, **transforms)
+                    )
+                flow_events = filter_events(
+                    flow_events, get_chans(flow_text), consens_chans, dtype
+                )
+                filter_record["events"] = len(flow_events)
+            yield flow_events
+        return
+
+    def read_dump(flow_path, dump_future):
+        with measure(metrics, "load", flow_path) as load_record:
+            dump_path, event_count = dump_future.result()  # in order
+            flow_events = np.fromfile(dump_path, dtype=dtype).reshape(
+                (event_count, len(consens_chans))
+            )
+            os.remove(dump_path)
+            load_record["events"] = event_count
+            load_record["bytes_read"] = os.path.getsize(flow_path)
+        return flow_events
+
+    with (
+        tempfile.TemporaryDirectory(dir=dump_dir) as temp_dir,
+        concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor,
+    ):
+        dump_futures = collections.deque()
+        for flow_path, flow_text in zip(flow_paths, flow_texts):
+            dump_futures.append(
+                (
+                    flow_path,
+                    executor.submit(
+                        dump_events,
+                        flow_path,
+                        flow_text,
+                        consens_chans,
+                        temp_dir,
+                        dtype,
+                        transforms,
+                    ),
+                )
+            )
+            if len(dump_futures) > 2 * processes:  # limit files on disk
+                yield read_dump(*dump_futures.popleft())
+        while dump_futures:
+            yield read_dump(*dump_futures.popleft())
+
+
+def open_shard(
+    shard_path,
+    chan_names,
+    shard_file=None,
+    shard_count=0,
+    dtype="float32",
+    text_items=None,
+    data_hash=None,
+):
+    """Finalize an open flow cytometry file and open the next one for streaming
+       events. Return the binary file handle of the next file, which the caller
+       closes, e.g. through a contextlib.ExitStack.
+    With a hash of its DATA segment, the checksum of the open file is stored
+    in TEXT and in a JSON file next to it.
+
+    Keyword arguments:
+    shard_path -- the path to the next file, "None" only finalizes the open file
+    chan_names -- list of channel names used as 'pnn' labels
+    shard_file -- binary file handle of the open file (default "None")
+    shard_count -- number of events in the open file (default 0)
+    dtype -- NumPy data type of the event values (default "float32")
+    text_items -- dictionary of additional TEXT keywords (default "None")
+    data_hash -- BLAKE2b hash object of the open file (default "None")
+    """
+    if shard_file:
+        if data_hash is not None:
+            write_checksum(shard_file.name, data_hash, shard_count)
+            text_items = dict(text_items or {}) | {CHECKSUM_KEY: data_hash.hexdigest()}
+        write_head(shard_file, chan_names, shard_count, dtype, text_items)
+        shard_file.close()
+    if shard_path:
+        with contextlib.ExitStack() as open_stack:
+            shard_file = open_stack.enter_context(open(shard_path, "wb"))
+            write_head(
+                shard_file, chan_names, dtype=dtype, text_items=text_items
+            )  # reserve space
+            open_stack.pop_all()  # keep open for streaming
+        return shard_file
+
+
+def scan_text(flow_paths, threads=None, cache=None, cache_root="", flow_stats=None):
+    """Read the TEXT keywords of flow cytometry files in parallel
+       and yield them in order of the file paths.
+
+    Keyword arguments:
+    flow_paths -- list of paths to flow cytometry files
+    threads -- maximum number of parallel reads (default "None")
+    cache -- metadata cache dictionary, updated in place (default "None")
+    cache_root -- the path to the directory containing the cache (default "")
+    flow_stats -- dictionary of stat results by file path (default "None")
+    """
+    cache = {} if cache is None else cache
+    flow_stats = flow_stats or {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        yield from executor.map(
+            lambda flow_path: cache_text(
+                flow_path, cache, cache_root, flow_stats.get(flow_path)
+            ),
+            flow_paths,
+        )
@@ -0,0 +1,623 @@
+"""
+flowtools.fcs - read and write flow cytometry files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+
+import flowio as fio
+import numpy as np
+
+from .files import is_cached
+
+
+def cache_text(flow_path, cache, cache_root="", flow_stat=None):
+    """Return the TEXT keywords of a flow cytometry file from the metadata cache
+       if the file's size and modification time are unchanged, otherwise read
+       the keywords from the file and update the cache.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    cache -- metadata cache dictionary
+    cache_root -- the path to the directory containing the cache (default "")
+    flow_stat -- stat result of the file, if known (default "None")
+    """
+    cache_key = os.path.relpath(flow_path, cache_root)
+    flow_stat = flow_stat or os.stat(flow_path)  # before reading
+    if is_cached(flow_path, cache, cache_root, flow_stat):
+        return cache[cache_key]["text"]
+    flow_text = read_text(flow_path)
+    cache[cache_key] = {
+        "size": flow_stat.st_size,
+        "mtime": flow_stat.st_mtime_ns,
+        "text": {
+            key: value
+            for key, value in flow_text.items()
+            if re.fullmatch(CACHE_KEYS, key)
+        },
+    }
+    return flow_text
+
+
+def cast_events(events, dtype="float32"):
+    """Return events as a contiguous 2-D array of the output data type.
+    Values for integer types are rounded and clipped to the range of the type,
+    missing values become zero.
+
+    Keyword arguments:
+    events -- 2-D NumPy array of events
+    dtype -- NumPy data type of the output (default "float32")
+    """
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        type_info = np.iinfo(dtype)
+        events = np.clip(np.nan_to_num(np.rint(events)), type_info.min, type_info.max)
+    return np.ascontiguousarray(events, dtype=dtype)
+
+
+def chain_hash(checksum):
+    """Return a BLAKE2b hash object for events appended to a DATA segment,
+       started from the checksum of the events before them.
+    Appended files are thus hashed without reading earlier events again.
+
+    Keyword arguments:
+    checksum -- hexadecimal checksum of the DATA segment before the appended events
+    """
+    data_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+    data_hash.update(bytes.fromhex(checksum))
+    return data_hash
+
+
+def decode_events(data_values, chan_count, chan_masks=None, chan_idxs=None):
+    """Return the raw values of a DATA segment as a 2-D NumPy array of events.
+    Mixed bit widths are unpacked to the widest integer type and integer
+    values are masked, both only for the selected channels.
+
+    Keyword arguments:
+    data_values -- 1-D NumPy array typed as returned by get_layout
+    chan_count -- number of channels per event
+    chan_masks -- bit masks of integer values by channel (default "None")
+    chan_idxs -- list of column indices to keep, all if "None" (default "None")
+    """
+    chan_idxs = range(chan_count) if chan_idxs is None else chan_idxs
+    if data_values.dtype.names:
+        flow_events = np.empty((len(data_values), len(chan_idxs)), chan_masks.dtype)
+        for col, idx in enumerate(chan_idxs):
+            flow_events[:, col] = data_values[data_values.dtype.names[idx]]
+    else:
+        flow_events = data_values.reshape((-1, chan_count))  # row-major
+        if list(chan_idxs) != list(range(chan_count)):
+            flow_events = flow_events[:, chan_idxs]  # copy columns only
+    if chan_masks is not None:
+        flow_events = flow_events & chan_masks[chan_idxs]
+    return flow_events
+
+
+def get_chans(flow_text):
+    """Return the channel dictionary from the TEXT keywords of a flow cytometry file.
+    Channels are in order of the keywords and provide the 'pnn' and 'pns' labels.
+
+    Keyword arguments:
+    flow_text -- TEXT keyword dictionary
+    """
+    return {
+        int(match.group(1)): {
+            "pnn": value,
+            "pns": flow_text.get(f"p{match.group(1)}s", ""),  # optional
+        }
+        for key, value in flow_text.items()
+        if (match := re.fullmatch(r"p(\d+)n", key))
+    }
+
+
+def get_fingerprint(flow_path, flow_text):
+    """Return the fingerprint of a flow cytometry file from its event count,
+       channel count, data type and a BLAKE2b hash of its DATA segment.
+    The DATA segment is hashed from a memory map without copying or decoding
+    events. Return "None" if the DATA segment cannot be located.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary
+    """
+    data_start = int(flow_text.get("begindata", "").strip() or 0)
+    data_end = int(flow_text.get("enddata", "").strip() or 0)
+    if not data_start:
+        return None
+    data_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+    if data_end >= data_start:
+        with (
+            open(flow_path, "rb") as flow_file,
+            mmap.mmap(flow_file.fileno(), 0, access=mmap.ACCESS_READ) as flow_map,
+            memoryview(flow_map)[data_start : data_end + 1] as data_view,
+        ):
+            data_hash.update(data_view)  # releases GIL
+    return "/".join(
+        (
+            flow_text.get("tot", ""),
+            flow_text["par"],
+            flow_text.get("datatype", ""),
+            data_hash.hexdigest(),
+        )
+    )
+
+
+def get_layout(flow_text):
+    """Return the layout of the DATA segment of a flow cytometry file as byte
+       offset, NumPy data type, number of events and bit masks of integer values.
+    Values of uniform bit width are typed one by one, mixed bit widths are typed
+    as one structured record per event. Return "None" for data that cannot be
+    read natively, i.e. ASCII, histogram or bit-packed values.
+
+    Keyword arguments:
+    flow_text -- TEXT keyword dictionary
+    """
+    chan_count = int(flow_text["par"])
+    chan_bits = [int(flow_text[f"p{pos}b"]) for pos in range(1, chan_count + 1)]
+    data_type = flow_text["datatype"].lower()
+    byte_order = {"1,2,3,4": "<", "1,2": "<", "4,3,2,1": ">", "2,1": ">"}.get(
+        flow_text["byteord"].replace(" ", "")
+    )
+    if (
+        not byte_order
+        or flow_text.get("mode", "l").lower() != "l"  # list mode
+        or not int(flow_text.get("begindata", "").strip() or 0)
+        or data_type not in ("f", "d", "i")
+        or any(bits not in (8, 16, 32, 64) for bits in chan_bits)  # bit-packed
+    ):
+        return None
+    chan_masks = None
+    if data_type == "i":
+        chan_masks = np.array(
+            [
+                min(2 ** (int(float(flow_text[f"p{pos}r"])) - 1).bit_length(), 2**bits)
+                - 1  # ignore bits above next power of 2 like FlowIO
+                for pos, bits in enumerate(chan_bits, start=1)
+            ],
+            dtype=f"u{max(chan_bits) // 8}",
+        )
+        if len(set(chan_bits)) == 1:
+            data_type = np.dtype(f"{byte_order}u{chan_bits[0] // 8}")
+            if np.all(chan_masks == np.iinfo(data_type).max):
+                chan_masks = None  # full range
+        else:
+            data_type = np.dtype(
+                [
+                    (f"p{pos}", f"{byte_order}u{bits // 8}")
+                    for pos, bits in enumerate(chan_bits, start=1)
+                ]
+            )
+    elif any(bits != (32 if data_type == "f" else 64) for bits in chan_bits):
+        return None
+    else:
+        data_type = np.dtype(byte_order + ("f4" if data_type == "f" else "f8"))
+    data_start = int(flow_text["begindata"])
+    event_count = int(flow_text.get("tot", "").strip() or 0) or (
+        (int(flow_text.get("enddata", "").strip() or 0) - data_start + 1)
+        // (sum(chan_bits) // 8)
+    )  # optional in FCS 2.0
+    return data_start, data_type, event_count, chan_masks
+
+
+def get_name(channel):
+    """Get channel label from flowio channel dictionary.
+    Try to retrieve the optional long name first and
+    if that fails try to get the short name.
+
+    Keyword arguments:
+    channels - the flowio channel dictionary
+    """
+    return (
+        channel.get("pns") or channel["pnn"]
+    )  # 'pns' value must be True, i.e. it must differ from "", None, False
+
+
+def get_text(
+    chan_names,
+    data_start=0,
+    data_end=0,
+    event_count=0,
+    dtype="float32",
+    text_items=None,
+):
+    """Build the TEXT segment of a flow cytometry file with fixed-width offsets.
+    Byte offsets and event count are zero-padded to a constant width, so that
+    the segment can be rewritten in place once the final values are known.
+    Additional keywords, like '$PnS' labels, '$PnR' ranges or custom keywords,
+    are added after the channel keywords and may replace '$PnE', '$PnG' or
+    '$PnR', but not keywords describing the layout of the DATA segment.
+
+    Keyword arguments:
+    chan_names -- list of channel names used as 'pnn' labels
+    data_start -- byte offset of the first event value (default 0)
+    data_end -- byte offset of the last event value (default 0)
+    event_count -- number of events in the DATA segment (default 0)
+    dtype -- NumPy data type of the event values (default "float32")
+    text_items -- dictionary of additional keywords and values (default "None")
+    """
+    delim = "/"
+    bit_count = np.dtype(dtype).itemsize * 8
+    text = {
+        "$BEGINANALYSIS": "0",
+        "$BEGINDATA": f"{data_start:0{FIXED_WIDTH}d}",
+        "$BEGINSTEXT": "0",
+        "$BYTEORD": BYTE_ORDER,
+        "$DATATYPE": DATA_TYPES[dtype],
+        "$ENDANALYSIS": "0",
+        "$ENDDATA": f"{data_end:0{FIXED_WIDTH}d}",
+        "$ENDSTEXT": "0",
+        "$MODE": "L",
+        "$NEXTDATA": "0",
+        "$PAR": str(len(chan_names)),
+        "$TOT": f"{event_count:0{FIXED_WIDTH}d}",
+    }
+    for pos, chan_name in enumerate(chan_names, start=1):
+        text[f"$P{pos}B"] = str(bit_count)  # uniform width
+        text[f"$P{pos}E"] = "0,0"  # linear values
+        text[f"$P{pos}G"] = "1.0"
+        text[f"$P{pos}R"] = (
+            "262144" if DATA_TYPES[dtype] != "I" else str(2**bit_count)
+        )  # full range of integers
+        text[f"$P{pos}N"] = chan_name
+    for key, value in (text_items or {}).items():
+        if re.fullmatch(LAYOUT_KEYS, key.upper()):
+            raise ValueError(f'Keyword "{key}" is set by the writer')
+        text[key.upper()] = str(value)
+    return (
+        delim
+        + "".join(
+            f"{key}{delim}{value.replace(delim, delim * 2)}{delim}"
+            for key, value in text.items()
+        )
+    ).encode("utf-8")
+
+
+def hash_data(fcs_file, data_start, data_end, data_hash=None, block_size=2**24):
+    """Hash the DATA segment of an open flow cytometry file without decoding
+       its events and return the BLAKE2b hash object.
+    Bytes are read into a reused buffer, an existing hash is continued.
+
+    Keyword arguments:
+    fcs_file -- binary file handle opened for reading
+    data_start -- byte offset of the first event value
+    data_end -- byte offset of the last event value
+    data_hash -- BLAKE2b hash object to update, new if "None" (default "None")
+    block_size -- number of bytes read at once (default 2**24)
+    """
+    if data_hash is None:
+        data_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+    data_buffer = memoryview(bytearray(block_size))
+    byte_count = data_end - data_start + 1  # inclusive
+    fcs_file.seek(data_start)
+    while byte_count > 0:
+        read_count = fcs_file.readinto(data_buffer[: min(block_size, byte_count)])
+        if not read_count:
+            break  # truncated file
+        data_hash.update(data_buffer[:read_count])
+        byte_count -= read_count
+    return data_hash
+
+
+def read_blocks(flow_path, flow_text, block_size=2**16, chan_idxs=None):
+    """Yield the events of a flow cytometry file as 2-D NumPy arrays
+       of at most block_size events each.
+    List-mode data of byte-aligned bit widths is read from the DATA segment
+    one block at a time, any other data is parsed by FlowIO at once.
+    Selected channels are gathered from each block before it is passed on.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary
+    block_size -- maximum number of events per block (default 2**16)
+    chan_idxs -- list of column indices to keep, all if "None" (default "None")
+    """
+    chan_count = int(flow_text["par"])
+    data_layout = get_layout(flow_text)
+    if data_layout:
+        data_start, data_type, event_count, chan_masks = data_layout
+        event_size = 1 if data_type.names else chan_count  # items per event
+        with open(flow_path, "rb") as flow_file:
+            flow_file.seek(data_start)
+            for start in range(0, event_count, block_size):
+                yield decode_events(
+                    np.fromfile(
+                        flow_file,
+                        dtype=data_type,
+                        count=min(block_size, event_count - start) * event_size,
+                    ),
+                    chan_count,
+                    chan_masks,
+                    chan_idxs,
+                )
+        return
+
+    # parse flow data
+    flow_events = read_flowio(flow_path)
+    if chan_idxs is not None:
+        flow_events = flow_events[:, chan_idxs]
+    for start in range(0, len(flow_events), block_size):
+        yield flow_events[start : start + block_size]
+
+
+def read_events(flow_path, flow_text):
+    """Return the events of a flow cytometry file as a 2-D NumPy array.
+    List-mode data of byte-aligned bit widths is memory-mapped from the DATA
+    segment and only copied to mask integer values or to unpack mixed bit
+    widths, any other data is parsed by FlowIO.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary
+    """
+    chan_count = int(flow_text["par"])
+    data_layout = get_layout(flow_text)
+    if data_layout:
+        data_start, data_type, event_count, chan_masks = data_layout
+        event_size = 1 if data_type.names else chan_count  # items per event
+        if not event_count:
+            data_values = np.empty(0, dtype=data_type)
+        else:
+            data_values = np.memmap(
+                flow_path,
+                dtype=data_type,
+                mode="r",
+                offset=data_start,
+                shape=(event_count * event_size,),
+            )
+        return decode_events(data_values, chan_count, chan_masks)
+
+    # parse flow data
+    return read_flowio(flow_path)
+
+
+def read_fcs(flow_path):
+    """Read a flow cytometry file and return its TEXT keywords,
+       its channel dictionary and its events as a 2-D NumPy array.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    """
+    flow_text = read_text(flow_path)
+    return flow_text, get_chans(flow_text), read_events(flow_path, flow_text)
+
+
+def read_flowio(flow_path):
+    """Return the events of a flow cytometry file parsed by FlowIO
+       as a 2-D NumPy array.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    """
+    flow_data = fio.FlowData(flow_path)
+    flow_events = np.reshape(
+        np.asarray(flow_data.events, dtype=np.dtype(flow_data.events.typecode)),
+        (flow_data.event_count, flow_data.channel_count),
+    )
+    assert np.array_equal(
+        flow_data.events[: flow_data.channel_count], flow_events[0]
+    ), "First cell differs after transformation."
+    assert np.array_equal(
+        flow_data.events[-flow_data.channel_count :], flow_events[-1]
+    ), "Last cell differs after transformation."
+    return flow_events
+
+
+def read_text(flow_path):
+    """Read the HEADER and TEXT segments of a flow cytometry file and
+       return the TEXT keywords as a dictionary.
+    Keywords are lowercase and stripped of '$' characters, same as in FlowIO.
+    Offsets of the DATA segment missing from TEXT, as in FCS 2.0,
+    are taken from HEADER.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    """
+    with open(flow_path, "rb") as flow_file:
+        flow_head = flow_file.read(58)  # HEADER without ANALYSIS offsets
+        text_start, text_end = int(flow_head[10:18]), int(flow_head[18:26])
+        flow_file.seek(text_start)
+        flow_text = flow_file.read(text_end - text_start + 1)
+    try:
+        flow_text = flow_text.decode("utf-8")
+    except UnicodeDecodeError:
+        flow_text = flow_text.decode("ISO-8859-1")
+    delim = re.escape(flow_text[0])
+    items = [
+        item.replace(flow_text[0] * 2, flow_text[0])  # escaped delimiters
+        for item in re.split(
+            f"(?<=[^{delim}]){delim}(?!{delim})",  # single delimiters
+            flow_text[1:-1].replace("$", ""),
+        )
+    ]
+    flow_text = dict(zip([key.lower() for key in items[::2]], items[1::2]))
+    data_start = int(flow_head[26:34].strip() or 0)
+    if data_start and not int(flow_text.get("begindata", "").strip() or 0):
+        flow_text["begindata"] = str(data_start)
+        flow_text["enddata"] = str(int(flow_head[34:42].strip() or 0))
+    return flow_text
+
+
+def select_chans(flow_chans, include=None, exclude=None):
+    """Return the positions of all channels matching any of the included
+       and none of the excluded names, in order of the channel dictionary.
+    Names are compared with the 'pnn' and 'pns' labels and may contain
+    shell-style wildcards.
+
+    Keyword arguments:
+    flow_chans -- channel dictionary
+    include -- list of channel names or patterns to keep, all if "None" (default "None")
+    exclude -- list of channel names or patterns to drop (default "None")
+    """
+
+    def is_match(chan, pats):
+        return any(
+            fnmatch.fnmatchcase(label, pat)
+            for label in (chan["pnn"], chan["pns"])
+            if label
+            for pat in pats
+        )
+
+    return [
+        pos
+        for pos, chan in flow_chans.items()
+        if (include is None or is_match(chan, include))
+        and not is_match(chan, exclude or [])
+    ]
+
+
+def write_checksum(fcs_path, data_hash, event_count, segments=None):
+    """Write the checksum of the DATA segment of a flow cytometry file
+       to a JSON file next to it and return the path to the JSON file.
+    Segments of appended events are hashed in a chain as by chain_hash.
+
+    Keyword arguments:
+    fcs_path -- the path to the flow cytometry file
+    data_hash -- BLAKE2b hash object of the DATA segment
+    event_count -- number of events in the DATA segment
+    segments -- list of events per write, one if "None" (default "None")
+    """
+    sum_path = os.path.splitext(fcs_path)[0] + "_checksum.json"
+    with open(sum_path, "w", encoding="utf-8") as sum_file:
+        json.dump(
+            {
+                "file": os.path.basename(fcs_path),
+                "algorithm": f"blake2b-{CHECKSUM_SIZE * 8}",
+                "checksum": data_hash.hexdigest(),
+                "events": event_count,
+            }
+            | ({"segments": segments} if segments else {}),
+            sum_file,
+            indent=2,
+        )
+    return sum_path
+
+
+def write_fcs(
+    fcs_path,
+    chan_names,
+    event_blocks,
+    dtype="float32",
+    text_items=None,
+    checksum=False,
+):
+    """Write a flow cytometry file in a single pass over blocks of events
+       and return the number of events written.
+    Blocks are appended to the DATA segment as they arrive, the HEADER and TEXT
+    segments are finalized in place after the last block has been written.
+    With checksum, the DATA segment is hashed while it is written and
+    its checksum is stored in TEXT and in a JSON file next to the file.
+
+    Keyword arguments:
+    fcs_path -- the path to the flow cytometry file
+    chan_names -- list of channel names used as 'pnn' labels
+    event_blocks -- iterable of 2-D NumPy arrays with one column per channel
+    dtype -- NumPy data type of the event values (default "float32")
+    text_items -- dictionary of additional keywords and values (default "None")
+    checksum -- store the checksum of the DATA segment (default "False")
+    """
+    event_count = 0
+    data_hash = None
+    if checksum:
+        data_hash = hashlib.blake2b(digest_size=CHECKSUM_SIZE)
+        text_items = dict(text_items or {}) | {CHECKSUM_KEY: CHECKSUM_NULL}
+    with open(fcs_path, "wb") as fcs_file:
+        write_head(fcs_file, chan_names, dtype=dtype, text_items=text_items)
+        for event_block in event_blocks:
+            if event_block.ndim != 2 or event_block.shape[1] != len(chan_names):
+                raise ValueError(
+                    f"Block of shape {event_block.shape} does not match "
+                    f"{len(chan_names)} channels"
+                )
+            if event_block.dtype != np.dtype(dtype):
+                event_block = cast_events(event_block, dtype)
+            event_block = np.ascontiguousarray(event_block)
+            event_block.tofile(fcs_file)  # native byte order
+            if data_hash:
+                data_hash.update(event_block)
+            event_count += len(event_block)
+        if data_hash:
+            text_items[CHECKSUM_KEY] = data_hash.hexdigest()
+        write_head(fcs_file, chan_names, event_count, dtype, text_items)
+    if data_hash:
+        write_checksum(fcs_path, data_hash, event_count)
+    return event_count
+
+
+def write_head(fcs_file, chan_names, event_count=0, dtype="float32", text_items=None):
+    """Write the HEADER and TEXT segments of a flow cytometry file and
+       return the byte offset of the DATA segment.
+    Call once before streaming events to the file and once more after
+    the last event has been written to finalize the event count and offsets.
+
+    Keyword arguments:
+    fcs_file -- binary file handle opened for writing
+    chan_names -- list of channel names used as 'pnn' labels
+    event_count -- number of events in the DATA segment (default 0)
+    dtype -- NumPy data type of the event values (default "float32")
+    text_items -- dictionary of additional keywords and values (default "None")
+    """
+    text_start = TEXT_START
+    data_start = text_start + len(
+        get_text(chan_names, dtype=dtype, text_items=text_items)
+    )  # constant
+    data_end = (
+        data_start + event_count * len(chan_names) * np.dtype(dtype).itemsize - 1
+    )  # inclusive
+    text_end = data_start - 1
+    if data_end <= 99_999_999:  # 8-digit fields in HEADER
+        data_offsets = (data_start, data_end)
+    else:
+        data_offsets = (0, 0)  # use TEXT values instead
+    fcs_file.seek(0)
+    fcs_file.write(
+        (
+            "FCS3.1    "
+            + "".join(
+                f"{offset:>8}" for offset in (text_start, text_end, *data_offsets, 0, 0)
+            )
+        )
+        .ljust(text_start)
+        .encode("ascii")
+    )
+    fcs_file.write(
+        get_text(chan_names, data_start, data_end, event_count, dtype, text_items)
+    )
+    return data_start
+
+
+# set keywords kept in metadata cache
+CACHE_KEYS = r"tot|par|datatype|byteord|mode|begindata|enddata|p\d+[bnrs]|spill(over)?"
+
+# set checksum of written DATA segments
+CHECKSUM_KEY = "DATA_BLAKE2B"  # custom keyword
+CHECKSUM_SIZE = 16  # bytes of digest
+CHECKSUM_NULL = "0" * CHECKSUM_SIZE * 2  # placeholder of same width
+
+# set layout of written files
+BYTE_ORDER = "1,2,3,4" if sys.byteorder == "little" else "4,3,2,1"  # native
+DATA_TYPES = {"float32": "F", "float64": "D", "uint16": "I", "uint32": "I"}
+FIXED_WIDTH = 20  # digits of offsets in TEXT
+LAYOUT_KEYS = r"\$(BEGIN|END)(ANALYSIS|DATA|STEXT)|\$(BYTEORD|DATATYPE|MODE|NEXTDATA|PAR|TOT)|\$P\d+[BN]"
+TEXT_START = 256  # leave room for HEADER
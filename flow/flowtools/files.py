@@ -0,0 +1,170 @@
+"""
+flowtools.files - file discovery, metadata cache and parallel jobs
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import concurrent.futures
+import fnmatch
+import json
+import os
+import re
+
+
+def get_files(path="", pat="*", anti="", recurse=False, threads=None):
+    """Iterate through all files in a directory structure and
+       return a dictionary of matching files with their stat results.
+    Subdirectories are scanned in parallel and patterns are matched
+    against the file names only. Unreadable directories are skipped.
+
+    Keyword arguments:
+    path -- the path to a directory containing files (default "")
+    pat -- string pattern that needs to be part of the file name (default "None")
+    anti -- string pattern that may not be part of the file name (default "None")
+    recurse -- boolen that allows the function to work recursively (default "False")
+    threads -- maximum number of directories scanned in parallel (default "None")
+    """
+    pat_match = re.compile(fnmatch.translate(os.path.normcase(pat))).match
+    anti_match = re.compile(fnmatch.translate(os.path.normcase(anti))).match
+
+    def scan_dir(dir_path):
+        file_stats, dir_paths = {}, []
+        try:
+            with os.scandir(dir_path) as dir_entries:
+                for dir_entry in dir_entries:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        dir_paths.append(dir_entry.path)
+                    elif dir_entry.is_file():
+                        file_name = os.path.normcase(dir_entry.name)
+                        if pat_match(file_name) and not anti_match(file_name):
+                            file_stats[dir_entry.path] = dir_entry.stat()  # cached
+        except OSError:
+            return {}, []  # skipped like in os.walk
+        return file_stats, dir_paths
+
+    file_stats = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        scan_futures = {executor.submit(scan_dir, path or os.curdir)}
+        while scan_futures:
+            done_futures, scan_futures = concurrent.futures.wait(
+                scan_futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for done_future in done_futures:
+                dir_stats, dir_paths = done_future.result()
+                file_stats.update(dir_stats)
+                if recurse:
+                    scan_futures |= {
+                        executor.submit(scan_dir, dir_path) for dir_path in dir_paths
+                    }
+    return file_stats
+
+
+def is_cached(file_path, cache, cache_root="", file_stat=None, options=None):
+    """Check if the metadata cache has an entry for a file
+       with unchanged size and modification time.
+    With options, the entry must also have been converted with the same options.
+
+    Keyword arguments:
+    file_path -- the path to a file
+    cache -- metadata cache dictionary
+    cache_root -- the path to the directory containing the cache (default "")
+    file_stat -- stat result of the file, if known (default "None")
+    options -- dictionary of conversion options that affect the output (default "None")
+    """
+    file_stat = file_stat or os.stat(file_path)
+    cache_entry = cache.get(os.path.relpath(file_path, cache_root), {})
+    return (
+        cache_entry.get("size") == file_stat.st_size
+        and cache_entry.get("mtime") == file_stat.st_mtime_ns
+        and (
+            options is None
+            or cache_entry.get("options") == json.loads(json.dumps(options))
+        )  # as stored in JSON
+    )
+
+
+def load_cache(cache_path):
+    """Return the metadata cache from a JSON file or an empty dictionary.
+
+    Keyword arguments:
+    cache_path -- the path to the JSON cache file
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}  # rebuild
+
+
+def run_jobs(job_func, job_args, job_costs, processes=1, budget=0):
+    """Run jobs and yield their keys and results as they complete.
+    With more than one process, jobs run in parallel processes,
+    starting with the largest job that fits into the memory budget.
+    A job exceeding the budget on its own only runs by itself.
+
+    Keyword arguments:
+    job_func -- top-level function called with the job arguments
+    job_args -- dictionary of argument tuples by job key
+    job_costs -- dictionary of estimated memory use in bytes by job key
+    processes -- maximum number of jobs run in parallel (default 1)
+    budget -- maximum estimated memory use of running jobs, 0 for none (default 0)
+    """
+    if processes < 2:
+        for job_key, job_arg in job_args.items():
+            yield job_key, job_func(*job_arg)
+        return
+
+    job_keys = sorted(job_args, key=lambda key: job_costs[key], reverse=True)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        job_futures = {}  # running jobs
+        while job_keys or job_futures:
+            job_cost = sum(job_costs[job_key] for job_key in job_futures.values())
+            for job_key in list(job_keys):  # largest first
+                if len(job_futures) >= processes:
+                    break
+                if job_futures and budget and job_cost + job_costs[job_key] > budget:
+                    continue  # try smaller jobs
+                job_futures[executor.submit(job_func, *job_args[job_key])] = job_key
+                job_cost += job_costs[job_key]
+                job_keys.remove(job_key)
+            done_futures, _ = concurrent.futures.wait(
+                job_futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for job_future in sorted(done_futures, key=job_futures.get):
+                job_result = job_future.result()  # raise job errors
+                yield job_futures.pop(job_future), job_result
+
+
+def save_cache(cache_path, cache):
+    """Write the metadata cache to a JSON file and
+       drop entries of files that no longer exist.
+
+    Keyword arguments:
+    cache_path -- the path to the JSON cache file
+    cache -- metadata cache dictionary
+    """
+    cache_root = os.path.dirname(cache_path)
+    cache = {
+        cache_key: cache_entry
+        for cache_key, cache_entry in sorted(cache.items())
+        if os.path.exists(os.path.join(cache_root, cache_key))
+    }
+    with open(cache_path + ".tmp", "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file, indent=2)
+    os.replace(cache_path + ".tmp", cache_path)  # atomic
@@ -0,0 +1,195 @@
+"""
+flowtools.metrics - per-stage timing and resource metrics
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+
+def get_peak_rss():
+    """Return the peak resident memory of this process in bytes,
+       "None" where it cannot be determined.
+    On Linux, the peak is measured since the last reset_peak_rss call.
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024  # kB
+    except OSError:
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024  # KiB
+
+
+@contextlib.contextmanager
+def measure(metrics, stage, file_path=""):
+    """Measure a processing stage and append its record to the metrics.
+    The yielded record can be updated with the number of events and bytes
+    read or written. Times are exclusive of stages measured within the stage,
+    peak memory is inclusive. Without metrics, nothing is measured.
+
+    Keyword arguments:
+    metrics -- list of stage records, "None" to disable measuring
+    stage -- name of the processing stage
+    file_path -- the path to the file processed in the stage (default "")
+    """
+    record = {
+        "stage": stage,
+        "file": file_path,
+        "events": 0,
+        "bytes_read": 0,
+        "bytes_written": 0,
+    }
+    if metrics is None:
+        yield record
+        return
+    nested_count = len(metrics)
+    reset_peak_rss()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        nested_records = metrics[nested_count:]
+        peak_rss = max(
+            [get_peak_rss() or 0]
+            + [(nested_record["peak_rss"] or 0) for nested_record in nested_records]
+        )
+        record["wall_s"] = (
+            time.perf_counter()
+            - wall_start
+            - sum(nested_record["wall_s"] for nested_record in nested_records)
+        )
+        record["cpu_s"] = (
+            time.process_time()
+            - cpu_start
+            - sum(nested_record["cpu_s"] for nested_record in nested_records)
+        )
+        record["peak_rss"] = peak_rss or None
+        metrics.append(record)
+
+
+def measure_iter(metrics, stage, items, file_path="", bytes_read=0):
+    """Yield the items of an iterable and append one record for the time spent
+       producing them to the metrics, once the iterable is exhausted.
+    Events are counted by the length of the items.
+
+    Keyword arguments:
+    metrics -- list of stage records, "None" to disable measuring
+    stage -- name of the processing stage
+    items -- iterable of items with a length, e.g. 2-D arrays of events
+    file_path -- the path to the file processed in the stage (default "")
+    bytes_read -- number of bytes read by the stage (default 0)
+    """
+    if metrics is None:
+        yield from items
+        return
+    record = {
+        "stage": stage,
+        "file": file_path,
+        "events": 0,
+        "bytes_read": bytes_read,
+        "bytes_written": 0,
+        "wall_s": 0.0,
+        "cpu_s": 0.0,
+    }
+    reset_peak_rss()
+    items = iter(items)
+    while True:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        item = next(items, None)
+        record["wall_s"] += time.perf_counter() - wall_start
+        record["cpu_s"] += time.process_time() - cpu_start
+        if item is None:
+            break
+        record["events"] += len(item)
+        yield item
+    record["peak_rss"] = get_peak_rss()
+    metrics.append(record)
+
+
+def reset_peak_rss():
+    """Reset the peak resident memory of this process to the current value,
+    where supported (Linux).
+    """
+    with (
+        contextlib.suppress(OSError),
+        open("/proc/self/clear_refs", "w", encoding="ascii") as refs_file,
+    ):
+        refs_file.write("5")
+
+
+def write_metrics(metrics_path, metrics):
+    """Write stage records to a JSON file with totals per stage and
+       to a comma-separated value file with one row per record.
+
+    Keyword arguments:
+    metrics_path -- the path to the JSON file, the csv file replaces the extension
+    metrics -- list of stage records
+    """
+    stages = {}  # {stage: totals}
+    for record in metrics:
+        totals = stages.setdefault(
+            record["stage"],
+            {
+                "files": 0,
+                "events": 0,
+                "bytes_read": 0,
+                "bytes_written": 0,
+                "wall_s": 0.0,
+                "cpu_s": 0.0,
+                "peak_rss": None,
+            },
+        )
+        totals["files"] += bool(record["file"])
+        for key in ("events", "bytes_read", "bytes_written", "wall_s", "cpu_s"):
+            totals[key] += record[key]
+        if record["peak_rss"] is not None:
+            totals["peak_rss"] = max(totals["peak_rss"] or 0, record["peak_rss"])
+    with open(metrics_path, "w", encoding="utf-8") as metrics_file:
+        json.dump({"stages": stages, "records": metrics}, metrics_file, indent=2)
+    with open(
+        os.path.splitext(metrics_path)[0] + ".csv", "w", encoding="utf-8", newline=""
+    ) as metrics_file:
+        metrics_writer = csv.DictWriter(metrics_file, fieldnames=METRICS_KEYS)
+        metrics_writer.writeheader()
+        metrics_writer.writerows(metrics)
+
+
+# set fields of stage records
+METRICS_KEYS = [
+    "stage",
+    "file",
+    "events",
+    "bytes_read",
+    "bytes_written",
+    "wall_s",
+    "cpu_s",
+    "peak_rss",
+]
@@ -0,0 +1,702 @@
+"""
+flowtools.to_fcs - convert comma-separated value or columnar to flow cytometry files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import concurrent.futures
+import contextlib
+import fnmatch
+import json
+import os
+
+import numpy as np
+
+from .fcs import DATA_TYPES, write_fcs
+from .files import get_files, is_cached, load_cache, run_jobs, save_cache
+from .metrics import measure, measure_iter, write_metrics
+
+
+def convert_csv(
+    csv_path, keep_csv=False, dtype="float32", cat_codes=None, metrics=None
+):
+    """Convert a comma-separated value file to a flow cytometry file
+       with non-numeric columns encoded in an annotation JSON file.
+
+    Keyword arguments:
+    csv_path -- the path to a comma-separated value file
+    keep_csv -- write the parsed values to an annotated csv file (default "False")
+    dtype -- NumPy data type of the event values (default "float32")
+    cat_codes -- shared category codes by column name, "None" for own (default "None")
+    metrics -- list of stage records, "None" to disable measuring (default "None")
+    """
+    import pandas as pd  # lazy
+
+    # read csv data
+    with measure(metrics, "decode", csv_path) as read_record:
+        csv_frame = pd.read_csv(
+            csv_path,
+            sep=r",",
+            header="infer",
+            engine="pyarrow",  # multithreading
+            skip_blank_lines=True,
+        )
+        read_record["events"] = len(csv_frame)
+        read_record["bytes_read"] = os.path.getsize(csv_path)
+
+    # write annotated csv file
+    if keep_csv:
+        with open(
+            os.path.join(
+                os.path.dirname(csv_path),
+                os.path.splitext(os.path.basename(csv_path))[0] + "_annots.csv",
+            ),
+            "w",
+        ) as csv_file:
+            csv_frame.to_csv(
+                csv_file, header=True, index=False
+            )  # keep header, ignore Pandas' index
+
+    with measure(metrics, "encode", csv_path) as encode_record:
+        # find non-numeric columns
+        nonum_cols = [
+            col
+            for col in csv_frame.columns
+            # use numeric annotations
+            if not pd.api.types.is_numeric_dtype(csv_frame[col])
+        ]
+
+        if cat_codes is not None:
+            # encode non-numeric columns with shared codes
+            for nonum_col in nonum_cols:
+                nonum_codes = (
+                    csv_frame[nonum_col]
+                    .astype("string")
+                    .map(cat_codes.get(nonum_col, {}))  # by value
+                )
+                if (nonum_codes.isna() & csv_frame[nonum_col].notna()).any():
+                    raise ValueError(
+                        f'"{os.path.basename(csv_path)}" has values in "{nonum_col}" without shared codes'
+                    )
+                csv_frame[nonum_col] = nonum_codes.fillna(-1).astype(
+                    "int64"
+                )  # missing values as -1
+
+        else:
+            # convert non-numeric to categorical columns
+            for nonum_col in nonum_cols:
+                csv_frame[nonum_col] = csv_frame[nonum_col].astype("category")
+
+            # write annotation JSON file
+            annots = {}
+            for nonum_col in nonum_cols:
+                nonum_col_cats = csv_frame[nonum_col].cat.categories  # unique only
+                csv_frame[nonum_col] = csv_frame[nonum_col].cat.codes  # replace all
+                annots[nonum_col] = pd.Series(
+                    range(len(nonum_col_cats)), index=nonum_col_cats
+                ).to_dict()  # preserve category order
+            with open(
+                os.path.join(
+                    os.path.dirname(csv_path),
+                    os.path.splitext(os.path.basename(csv_path))[0] + "_annots.json",
+                ),
+                "w",
+            ) as annot_file:
+                json.dump(annots, annot_file, indent=2)
+        if DATA_TYPES[dtype] == "I":
+            for nonum_col in nonum_cols:
+                if (csv_frame[nonum_col] < 0).any():  # unsigned
+                    raise ValueError(
+                        f'"{os.path.basename(csv_path)}" has missing values in "{nonum_col}", not supported by --dtype {dtype}'
+                    )
+        encode_record["events"] = len(csv_frame)
+
+    # write fcs file
+    fcs_path = os.path.join(
+        os.path.dirname(csv_path),
+        os.path.splitext(os.path.basename(csv_path))[0] + "_annots.fcs",
+    )
+    with measure(metrics, "write", fcs_path) as write_record:
+        write_record["events"] = write_fcs(
+            fcs_path,
+            list(csv_frame.columns),
+            [
+                csv_frame.to_numpy(
+                    dtype=dtype if DATA_TYPES[dtype] != "I" else "float64"
+                )  # single copy for floats
+            ],
+            dtype,
+        )
+        write_record["bytes_written"] = os.path.getsize(fcs_path)
+
+
+def convert_file(
+    file_path,
+    keep_csv=False,
+    stream=False,
+    block_size=2**20,
+    dtype="float32",
+    cat_codes=None,
+    metrics=False,
+):
+    """Convert a comma-separated value, Parquet or Arrow IPC file
+       to a flow cytometry file, streaming all but csv files by default.
+    Return the stage records of the conversion if measured.
+
+    Keyword arguments:
+    file_path -- the path to a csv, Parquet or Arrow IPC/Feather file
+    keep_csv -- write the parsed values to an annotated csv file (default "False")
+    stream -- convert csv files in record batches, falling back to a single
+              read when later values do not fit the types (default "False")
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    dtype -- NumPy data type of the event values (default "float32")
+    cat_codes -- shared category codes by column name, "None" for own (default "None")
+    metrics -- measure reading, encoding and writing of events (default "False")
+    """
+    import pyarrow as pa  # lazy
+
+    stage_metrics = [] if metrics else None
+    if stream or not file_path.lower().endswith(".csv"):
+        try:
+            stream_table(
+                file_path, keep_csv, block_size, dtype, cat_codes, stage_metrics
+            )
+            return stage_metrics
+        except pa.ArrowInvalid:
+            if not file_path.lower().endswith(".csv"):
+                raise
+            # later values beyond the first batch's column types, like in Pandas
+            stage_metrics = [] if metrics else None
+    convert_csv(file_path, keep_csv, dtype, cat_codes, stage_metrics)
+    return stage_metrics
+
+
+def get_values(cat_col):
+    """Return the distinct values of a non-numeric column as strings
+       in order of appearance, dictionary-encoded columns are not decoded.
+
+    Keyword arguments:
+    cat_col -- Arrow array of a non-numeric column
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.compute as pc
+
+    if pa.types.is_dictionary(cat_col.type):
+        cat_values = cat_col.dictionary.cast(pa.string()).take(
+            pc.drop_null(pc.unique(cat_col.indices))
+        )
+    else:
+        cat_values = pc.drop_null(pc.unique(cat_col.cast(pa.string())))
+    return cat_values.to_pylist()
+
+
+def is_numeric(field_type):
+    """Return "True" for Arrow types written to flow cytometry files as values.
+
+    Keyword arguments:
+    field_type -- Arrow data type of a column
+    """
+    import pyarrow as pa  # lazy
+
+    return (
+        pa.types.is_integer(field_type)
+        or pa.types.is_floating(field_type)
+        or pa.types.is_boolean(field_type)
+    )
+
+
+def open_batches(file_path, block_size=2**20, cats_only=False):
+    """Open a comma-separated value, Parquet or Arrow IPC file for reading
+       in record batches and return its schema and an iterator of batches.
+    Arrow IPC files are memory-mapped and Parquet string columns are read
+    dictionary-encoded, csv files are read as by open_csv.
+
+    Keyword arguments:
+    file_path -- the path to a csv, Parquet or Arrow IPC/Feather file
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    cats_only -- read only the non-numeric columns (default "False")
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.ipc as paipc
+    import pyarrow.parquet as papq
+
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == ".parquet":
+        parquet_file = papq.ParquetFile(
+            file_path,
+            read_dictionary=[
+                field.name
+                for field in papq.read_schema(file_path)
+                if pa.types.is_string(field.type)
+                or pa.types.is_large_string(field.type)
+            ],
+            memory_map=True,
+        )
+
+        file_schema = parquet_file.schema_arrow
+        if cats_only:
+            file_schema = pa.schema(
+                [field for field in file_schema if not is_numeric(field.type)]
+            )
+
+        def iter_parquet():
+            with parquet_file:
+                yield from parquet_file.iter_batches(columns=file_schema.names)
+
+        return file_schema, iter_parquet()
+    if file_ext in (".arrow", ".feather"):
+        ipc_file = paipc.open_file(pa.memory_map(file_path))
+        file_schema = ipc_file.schema
+        if cats_only:
+            file_schema = pa.schema(
+                [field for field in file_schema if not is_numeric(field.type)]
+            )
+
+        def iter_ipc():
+            with ipc_file:
+                for idx in range(ipc_file.num_record_batches):
+                    yield ipc_file.get_batch(idx).select(
+                        file_schema.names
+                    )  # without copy
+
+        return file_schema, iter_ipc()
+    csv_reader = open_csv(file_path, block_size, cats_only)
+
+    def iter_csv():
+        with csv_reader:
+            yield from csv_reader
+
+    return csv_reader.schema, iter_csv()
+
+
+def open_csv(csv_path, block_size=2**20, cats_only=False):
+    """Open a comma-separated value file for reading in record batches.
+    Column types are inferred from the first batch, integer columns are read
+    in double precision to allow later decimals and missing values, empty
+    columns as strings to allow later values of either kind. Empty and other
+    missing values are read as nulls like in Pandas.
+
+    Keyword arguments:
+    csv_path -- the path to a comma-separated value file
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    cats_only -- parse only the non-numeric columns of the first batch (default "False")
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.csv as pacsv
+
+    read_options = pacsv.ReadOptions(block_size=block_size)
+    null_values = [*pacsv.ConvertOptions().null_values, "<NA>", "None"]  # like Pandas
+    with pacsv.open_csv(
+        csv_path,
+        read_options=read_options,
+        convert_options=pacsv.ConvertOptions(
+            null_values=null_values, strings_can_be_null=True
+        ),
+    ) as csv_reader:
+        csv_schema = csv_reader.schema  # inferred from first batch
+    return pacsv.open_csv(
+        csv_path,
+        read_options=read_options,
+        convert_options=pacsv.ConvertOptions(
+            column_types={
+                field.name: pa.float64()
+                if pa.types.is_integer(field.type)
+                else pa.string()  # decided later
+                for field in csv_schema
+                if pa.types.is_integer(field.type) or pa.types.is_null(field.type)
+            },
+            include_columns=[
+                field.name for field in csv_schema if not is_numeric(field.type)
+            ]
+            if cats_only
+            else None,
+            null_values=null_values,
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def scan_cats(file_path, block_size=2**20):
+    """Return the distinct values of all non-numeric columns
+       of a comma-separated value, Parquet or Arrow IPC file by column name.
+    Only non-numeric columns are read, csv string columns are decided
+    by their first values as by stream_table.
+
+    Keyword arguments:
+    file_path -- the path to a csv, Parquet or Arrow IPC/Feather file
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.compute as pc
+
+    file_schema, file_batches = open_batches(file_path, block_size, cats_only=True)
+    cat_values = {field.name: set() for field in file_schema}
+    open_names = (  # undecided csv columns
+        {field.name for field in file_schema if pa.types.is_string(field.type)}
+        if file_path.lower().endswith(".csv")
+        else set()
+    )
+    for file_batch in file_batches:
+        for cat_name in list(cat_values):
+            cat_col = file_batch.column(cat_name)
+            if cat_name in open_names and cat_col.null_count < len(cat_col):
+                open_names.remove(cat_name)
+                try:
+                    pc.cast(cat_col, pa.float64())
+                except pa.ArrowInvalid:
+                    pass  # categories
+                else:
+                    del cat_values[cat_name]  # numeric
+                    continue
+            cat_values[cat_name].update(get_values(cat_col))
+    for cat_name in open_names:  # empty like in Pandas
+        del cat_values[cat_name]
+    return cat_values
+
+
+def stream_table(
+    file_path,
+    keep_csv=False,
+    block_size=2**20,
+    dtype="float32",
+    cat_codes=None,
+    metrics=None,
+):
+    """Convert a comma-separated value, Parquet or Arrow IPC file to a flow
+       cytometry file one record batch at a time.
+    Non-numeric columns are encoded by dictionaries that grow in order of
+    appearance unless shared dictionaries are given, events are appended
+    to the DATA segment in the output data type. Non-numeric columns are
+    mapped to the codes by the values of their dictionaries. Csv string columns
+    without values so far hold back batches until their first values decide
+    between numbers and categories, like in Pandas; empty columns are numeric.
+
+    Keyword arguments:
+    file_path -- the path to a csv, Parquet or Arrow IPC/Feather file
+    keep_csv -- write the parsed values to an annotated csv file (default "False")
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    dtype -- NumPy data type of the event values (default "float32")
+    cat_codes -- shared category codes by column name, "None" for own (default "None")
+    metrics -- list of stage records, "None" to disable measuring (default "None")
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.compute as pc
+
+    base_path = os.path.join(
+        os.path.dirname(file_path), os.path.splitext(os.path.basename(file_path))[0]
+    )
+    file_schema, file_batches = open_batches(file_path, block_size)
+    file_batches = measure_iter(
+        metrics, "decode", file_batches, file_path, os.path.getsize(file_path)
+    )
+    chan_names = file_schema.names
+    col_codes = {  # {index: {value: code}}
+        idx: dict((cat_codes or {}).get(field.name, {}))
+        for idx, field in enumerate(file_schema)
+        if not is_numeric(field.type)
+    }
+
+    open_idxs = (  # undecided csv columns
+        {idx for idx in col_codes if pa.types.is_string(file_schema.field(idx).type)}
+        if file_path.lower().endswith(".csv")
+        else set()
+    )
+    cast_idxs = set()  # numeric csv string columns
+
+    def decide_cols(file_batch):
+        for idx in list(open_idxs):
+            file_col = file_batch.column(idx)
+            if file_col.null_count < len(file_col):  # first values
+                open_idxs.remove(idx)
+                try:
+                    pc.cast(file_col, pa.float64())
+                except pa.ArrowInvalid:
+                    continue  # categories
+                cast_idxs.add(idx)
+                del col_codes[idx]
+
+    def encode_batches(csv_file):
+        hold_batches = []
+        for file_batch in file_batches:
+            decide_cols(file_batch)
+            hold_batches.append(file_batch)
+            if not open_idxs:
+                for hold_batch in hold_batches:
+                    yield encode_batch(hold_batch, csv_file)
+                hold_batches.clear()
+        for idx in open_idxs:  # empty like in Pandas
+            cast_idxs.add(idx)
+            del col_codes[idx]
+        open_idxs.clear()
+        for hold_batch in hold_batches:
+            yield encode_batch(hold_batch, csv_file)
+
+    def encode_batch(file_batch, csv_file):
+        if keep_csv:
+            file_batch.to_pandas().to_csv(
+                csv_file, header=not csv_file.tell(), index=False
+            )  # keep header once, ignore Pandas' index
+        fcs_cols = []
+        for idx, file_col in enumerate(file_batch.columns):
+            if idx in cast_idxs:
+                file_col = pc.cast(file_col, pa.float64())
+            elif idx in col_codes:
+                for value in get_values(file_col):  # in order
+                    if value not in col_codes[idx]:
+                        col_codes[idx][value] = len(col_codes[idx])
+                if not pa.types.is_dictionary(file_col.type):
+                    file_col = pc.dictionary_encode(
+                        file_col.cast(pa.string())
+                    )  # look up codes by value
+                dict_codes = np.array(
+                    [
+                        col_codes[idx].get(value, -1)
+                        for value in file_col.dictionary.cast(pa.string()).to_pylist()
+                    ]
+                    + [-1],  # missing values like Pandas
+                )
+                file_col = dict_codes[
+                    pc.fill_null(file_col.indices, len(file_col.dictionary)).to_numpy(
+                        zero_copy_only=False
+                    )
+                ]
+            fcs_cols.append(
+                file_col
+                if isinstance(file_col, np.ndarray)
+                else file_col.to_numpy(zero_copy_only=False)
+            )
+            if (
+                idx in col_codes
+                and DATA_TYPES[dtype] == "I"
+                and (fcs_cols[-1] < 0).any()  # unsigned
+            ):
+                raise ValueError(
+                    f'"{os.path.basename(file_path)}" has missing values in "{chan_names[idx]}", not supported by --dtype {dtype}'
+                )
+        return np.stack(
+            fcs_cols,
+            axis=1,
+            dtype=dtype if DATA_TYPES[dtype] != "I" else "float64",
+        )  # single copy for floats
+
+    # write events batch by batch
+    try:
+        with (
+            measure(metrics, "write", base_path + "_annots.fcs") as write_record,
+            (
+                open(base_path + "_annots.csv", "w")
+                if keep_csv
+                else contextlib.nullcontext()
+            ) as csv_file,
+        ):
+            write_record["events"] = write_fcs(
+                base_path + "_annots.fcs", chan_names, encode_batches(csv_file), dtype
+            )
+            write_record["bytes_written"] = os.path.getsize(base_path + "_annots.fcs")
+    except ValueError:
+        os.remove(base_path + "_annots.fcs")  # incomplete
+        raise
+
+    # write annotation JSON file
+    if cat_codes is None:
+        with open(base_path + "_annots.json", "w") as annot_file:
+            json.dump(
+                {chan_names[idx]: codes for idx, codes in col_codes.items()},
+                annot_file,
+                indent=2,
+            )
+
+
+def table_to_fcs(
+    paths=None,
+    path="",
+    in_formats=("csv",),
+    cache=False,
+    recurse=False,
+    keep_csv=False,
+    dtype="float32",
+    shared_annots=False,
+    stream=False,
+    block_size=2**20,
+    processes=1,
+    memory_budget=0,
+    metrics_path="",
+):
+    """Convert comma-separated value or columnar files to flow cytometry files
+       next to each file and return the paths to the written files.
+    Non-numeric columns are encoded by an annotation JSON file per file
+    or by one shared annotation file in path.
+
+    Keyword arguments:
+    paths -- list of paths to csv, Parquet or Arrow IPC files, all in path if "None" (default "None")
+    path -- the path to a directory containing files and the cache (default "")
+    in_formats -- input file formats collected from path (default ("csv",))
+    cache -- keep file metadata in a JSON file in path to skip unchanged files (default "False")
+    recurse -- include files in subdirectories of path (default "False")
+    keep_csv -- write the parsed values to annotated csv files (default "False")
+    dtype -- NumPy data type of the event values (default "float32")
+    shared_annots -- encode non-numeric columns of all files with shared codes (default "False")
+    stream -- convert csv files in record batches (default "False")
+    block_size -- number of bytes of csv text per record batch (default 2**20)
+    processes -- maximum number of files converted in parallel (default 1)
+    memory_budget -- maximum estimated bytes of files converted in parallel, 0 for no limit (default 0)
+    metrics_path -- the path to a JSON file for stage metrics, none if empty (default "")
+    """
+    metrics = [] if metrics_path else None
+
+    # collect csv file names
+    csv_path = os.path.abspath(path or os.curdir)
+    with measure(metrics, "discover"):
+        if paths is None:
+            csv_stats = {
+                file_path: file_stat
+                for file_path, file_stat in get_files(
+                    path=csv_path,
+                    pat="*",
+                    anti="*_annots.csv",
+                    recurse=recurse,
+                ).items()
+                if os.path.splitext(file_path)[1].lower()[1:] in in_formats
+                and not fnmatch.fnmatch(file_path, "*_metrics.csv")  # reports
+            }
+        else:
+            csv_stats = {
+                os.path.abspath(file_path): os.stat(file_path) for file_path in paths
+            }
+    csv_paths = sorted(csv_stats)
+    csv_paths_len = len(csv_paths)
+    cache_path = os.path.join(csv_path, ".csv_to_fcs_cache.json")
+    csv_cache = load_cache(cache_path) if cache else {}
+    cache_options = {
+        "keep_csv": keep_csv,
+        "dtype": dtype,
+        "shared_annots": shared_annots,
+    }  # affect output files
+    annots_path = os.path.join(
+        csv_path, os.path.basename(csv_path) + "_shared_annots.json"
+    )
+
+    print("\nConverting files:")
+    csv_paths_width = len(str(csv_paths_len))
+    csv_jobs = {}
+    csv_sizes = {}
+    fcs_paths = []
+    done_count = 0
+    for csv_path in csv_paths:
+        base_path = os.path.join(
+            os.path.dirname(csv_path), os.path.splitext(os.path.basename(csv_path))[0]
+        )
+
+        # skip unchanged files
+        if (
+            cache
+            and is_cached(
+                csv_path,
+                csv_cache,
+                os.path.dirname(cache_path),
+                csv_stats[csv_path],
+                cache_options,
+            )
+            and os.path.exists(
+                annots_path if shared_annots else base_path + "_annots.json"
+            )
+            and os.path.exists(base_path + "_annots.fcs")
+        ):
+            done_count += 1
+            print(
+                f'{done_count:>{csv_paths_width}}/{csv_paths_len}: "{os.path.basename(csv_path)}" (unchanged)'
+            )
+            continue
+        csv_jobs[csv_path] = None  # arguments follow
+
+    # extend shared category codes by new values
+    cat_codes = None
+    if shared_annots:
+        cat_codes = {}  # {column: {value: code}}
+        if os.path.exists(annots_path):
+            with open(annots_path, "r", encoding="utf-8") as annot_file:
+                cat_codes = json.load(annot_file)  # keep previous codes
+        with measure(metrics, "scan_annots"):
+            new_values = {}  # {column: values}
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                for cat_values in executor.map(
+                    scan_cats, csv_jobs, [block_size] * len(csv_jobs)
+                ):
+                    for cat_name, values in cat_values.items():
+                        new_values.setdefault(cat_name, set()).update(values)
+        for cat_name, values in new_values.items():
+            codes = cat_codes.setdefault(cat_name, {})
+            for value in sorted(values - codes.keys()):
+                codes[value] = len(codes)  # append new values
+        with open(annots_path + ".tmp", "w", encoding="utf-8") as annot_file:
+            json.dump(cat_codes, annot_file, indent=2)
+        os.replace(annots_path + ".tmp", annots_path)  # atomic
+
+    for csv_path in csv_jobs:
+        csv_jobs[csv_path] = (
+            csv_path,
+            keep_csv,
+            stream,
+            block_size,
+            dtype,
+            cat_codes,
+            metrics is not None,
+        )
+        if not csv_path.lower().endswith(".csv"):
+            csv_sizes[csv_path] = csv_stats[csv_path].st_size  # decoded batches
+        elif stream:
+            csv_sizes[csv_path] = (
+                min(csv_stats[csv_path].st_size, 4 * block_size) * MEMORY_FACTOR
+            )  # few batches
+        else:
+            csv_sizes[csv_path] = csv_stats[csv_path].st_size * MEMORY_FACTOR
+
+    # write fcs files
+    for csv_path, job_metrics in run_jobs(
+        convert_file,
+        csv_jobs,
+        csv_sizes,
+        processes=processes,
+        budget=memory_budget,
+    ):
+        done_count += 1
+        print(
+            f'{done_count:>{csv_paths_width}}/{csv_paths_len}: "{os.path.basename(csv_path)}"'
+        )
+        fcs_paths.append(os.path.splitext(csv_path)[0] + "_annots.fcs")
+        if metrics is not None:
+            metrics.extend(job_metrics)  # from worker processes
+
+        # remember converted file
+        csv_stat = csv_stats[csv_path]  # before reading
+        csv_cache[os.path.relpath(csv_path, os.path.dirname(cache_path))] = {
+            "size": csv_stat.st_size,
+            "mtime": csv_stat.st_mtime_ns,
+            "options": cache_options,
+        }
+
+    if cache:
+        save_cache(cache_path, csv_cache)
+    if metrics is not None:
+        write_metrics(metrics_path, metrics)
+    return fcs_paths
+
+
+# estimate memory use per byte of csv file
+MEMORY_FACTOR = 4
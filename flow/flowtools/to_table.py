@@ -0,0 +1,373 @@
+"""
+flowtools.to_table - convert flow cytometry to comma-separated value or columnar files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+
+import numpy as np
+
+from .fcs import cache_text, get_chans, get_name, read_blocks, select_chans
+from .files import get_files, is_cached, load_cache, run_jobs, save_cache
+from .metrics import measure, measure_iter, write_metrics
+from .transform import apply_steps, get_steps
+
+
+def convert_fcs(
+    fcs_path,
+    fcs_text,
+    out_path,
+    out_format="csv",
+    digits=0,
+    compression=None,
+    block_size=2**20,
+    chunk_size=2**16,
+    chan_poss=None,
+    metrics=False,
+    transforms=None,
+):
+    """Convert a flow cytometry file to a comma-separated value or columnar file.
+    Events are read and written in blocks, so memory use does not grow with
+    the number of events in list-mode files of uniform bit width.
+    Blocks are compensated and transformed as they are read, before
+    channels are selected, and measured together with decoding.
+    Return the stage records of the conversion if measured.
+
+    Keyword arguments:
+    fcs_path -- the path to a flow cytometry file
+    fcs_text -- TEXT keyword dictionary
+    out_path -- the path to the output file
+    out_format -- "csv", "parquet" or "feather"/"arrow" (default "csv")
+    digits -- number of significant digits in csv files, 0 for exact (default 0)
+    compression -- codec for columnar files (default "None")
+    block_size -- number of events per row group or record batch (default 2**20)
+    chunk_size -- number of events per block in csv files (default 2**16)
+    chan_poss -- list of channel positions to keep, all if "None" (default "None")
+    metrics -- measure reading and writing of events (default "False")
+    transforms -- keyword arguments of get_steps, none if "None" (default "None")
+    """
+    stage_metrics = [] if metrics else None
+    fcs_chans = get_chans(fcs_text)
+    chan_poss = list(fcs_chans) if chan_poss is None else chan_poss
+    chan_idxs = [pos - 1 for pos in chan_poss]  # integer
+    if chan_idxs == list(range(int(fcs_text["par"]))):
+        chan_idxs = None  # keep all columns
+    fcs_names = [get_name(fcs_chans[pos]) for pos in chan_poss]
+    fcs_blocks = read_blocks(
+        fcs_path,
+        fcs_text,
+        chunk_size if out_format == "csv" else block_size,
+        chan_idxs if not transforms else None,
+    )
+    if transforms:
+        steps = get_steps(fcs_path, fcs_text, **transforms)
+        fcs_blocks = (
+            apply_steps(fcs_block, steps)[:, chan_idxs]
+            if chan_idxs is not None
+            else apply_steps(fcs_block, steps)
+            for fcs_block in fcs_blocks
+        )
+    fcs_blocks = measure_iter(
+        stage_metrics, "decode", fcs_blocks, fcs_path, os.path.getsize(fcs_path)
+    )
+    with (
+        measure(stage_metrics, "write", out_path) as write_record,
+        open(out_path, "wb") as out_file,
+    ):
+        if out_format == "csv":
+            write_csv(out_file, fcs_blocks, fcs_names, digits=digits)
+        else:
+            write_table(
+                out_file, fcs_blocks, fcs_names, out_format, compression=compression
+            )
+        if stage_metrics is not None:
+            write_record["events"] = stage_metrics[-1]["events"]  # decoded blocks
+        write_record["bytes_written"] = out_file.tell()
+    return stage_metrics
+
+
+def fcs_to_table(
+    paths=None,
+    path="",
+    out_format="csv",
+    cache=False,
+    recurse=False,
+    digits=0,
+    compression=None,
+    row_group_size=2**20,
+    channels=None,
+    exclude_channels=None,
+    chunk_size=2**16,
+    processes=1,
+    memory_budget=0,
+    metrics_path="",
+    transforms=None,
+):
+    """Convert flow cytometry files to comma-separated value or columnar files
+       next to each file and return the paths to the written files.
+    Events are optionally compensated and transformed in the same pass.
+
+    Keyword arguments:
+    paths -- list of paths to flow cytometry files, all in path if "None" (default "None")
+    path -- the path to a directory containing files and the cache (default "")
+    out_format -- "csv", "parquet" or "feather"/"arrow" (default "csv")
+    cache -- keep file metadata in a JSON file in path to skip unchanged files (default "False")
+    recurse -- include files in subdirectories of path (default "False")
+    digits -- number of significant digits in csv files, 0 for exact (default 0)
+    compression -- codec for columnar files (default "None")
+    row_group_size -- number of events per row group or record batch (default 2**20)
+    channels -- list of channel names or patterns to keep (default "None")
+    exclude_channels -- list of channel names or patterns to drop (default "None")
+    chunk_size -- number of events per block in csv files (default 2**16)
+    processes -- maximum number of files converted in parallel (default 1)
+    memory_budget -- maximum bytes of files converted in parallel, 0 for no limit (default 0)
+    metrics_path -- the path to a JSON file for stage metrics, none if empty (default "")
+    transforms -- keyword arguments of get_steps, none if "None" (default "None")
+    """
+    metrics = [] if metrics_path else None
+
+    # collect fcs file names
+    fcs_path = os.path.abspath(path or os.curdir)
+    with measure(metrics, "discover"):
+        if paths is None:
+            fcs_stats = get_files(path=fcs_path, pat="*.fcs", anti="", recurse=recurse)
+        else:
+            fcs_stats = {
+                os.path.abspath(fcs_path): os.stat(fcs_path) for fcs_path in paths
+            }
+    fcs_paths = sorted(fcs_stats)
+    fcs_paths_len = len(fcs_paths)
+    cache_path = os.path.join(fcs_path, ".fcs_to_csv_cache.json")
+    fcs_cache = load_cache(cache_path) if cache else {}
+    cache_options = {
+        "format": out_format,
+        "digits": digits,
+        "compression": compression,
+        "row_group_size": row_group_size,
+        "channels": channels,
+        "exclude_channels": exclude_channels,
+        "transforms": transforms,
+    }  # affect output files
+
+    print("\nConverting files:")
+    fcs_paths_width = len(str(fcs_paths_len))
+    fcs_jobs = {}
+    fcs_sizes = {}
+    out_paths = []
+    done_count = 0
+    for fcs_path in fcs_paths:
+        out_path = os.path.join(
+            os.path.dirname(fcs_path),
+            os.path.splitext(os.path.basename(fcs_path))[0] + "." + out_format,
+        )
+
+        # skip unchanged files
+        if (
+            cache
+            and is_cached(
+                fcs_path,
+                fcs_cache,
+                os.path.dirname(cache_path),
+                fcs_stats[fcs_path],
+                cache_options,
+            )
+            and os.path.exists(out_path)
+        ):
+            done_count += 1
+            print(
+                f'{done_count:>{fcs_paths_width}}/{fcs_paths_len}: "{os.path.basename(fcs_path)}" (unchanged)'
+            )
+            continue
+
+        # read fcs metadata
+        with measure(metrics, "parse_text", fcs_path):
+            fcs_text = cache_text(
+                fcs_path, fcs_cache, os.path.dirname(cache_path), fcs_stats[fcs_path]
+            )
+
+        # select channels once per file
+        chan_poss = select_chans(get_chans(fcs_text), channels, exclude_channels)
+        if not chan_poss:
+            done_count += 1
+            print(
+                f'{done_count:>{fcs_paths_width}}/{fcs_paths_len}: "{os.path.basename(fcs_path)}" (no channels)'
+            )
+            continue
+        fcs_jobs[fcs_path] = (
+            fcs_path,
+            fcs_text,
+            out_path,
+            out_format,
+            digits,
+            compression,
+            row_group_size,
+            chunk_size,
+            chan_poss,
+            metrics is not None,
+            transforms,
+        )
+        fcs_sizes[fcs_path] = fcs_stats[fcs_path].st_size  # estimated memory
+
+    # write output data
+    for fcs_path, job_metrics in run_jobs(
+        convert_fcs,
+        fcs_jobs,
+        fcs_sizes,
+        processes=processes,
+        budget=memory_budget,
+    ):
+        done_count += 1
+        print(
+            f'{done_count:>{fcs_paths_width}}/{fcs_paths_len}: "{os.path.basename(fcs_path)}"'
+        )
+        out_paths.append(fcs_jobs[fcs_path][2])
+        if metrics is not None:
+            metrics.extend(job_metrics)  # from worker processes
+
+        # remember conversion options
+        fcs_cache[os.path.relpath(fcs_path, os.path.dirname(cache_path))]["options"] = (
+            cache_options
+        )
+
+    if cache:
+        save_cache(cache_path, fcs_cache)
+    if metrics is not None:
+        write_metrics(metrics_path, metrics)
+    return out_paths
+
+
+def round_digits(values, digits):
+    """Return values rounded to a number of significant digits.
+
+    Keyword arguments:
+    values -- NumPy array of floating point values
+    digits -- number of significant digits
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        exps = digits - 1 - np.floor(np.log10(np.abs(values)))
+        exps = np.nan_to_num(exps, nan=0.0, posinf=0.0, neginf=0.0)  # 0, nan, inf
+        scales = 10.0 ** np.abs(exps)  # exact powers of ten
+        return np.where(
+            exps >= 0,
+            np.round(values * scales) / scales,
+            np.round(values / scales) * scales,
+        )
+
+
+def write_csv(csv_file, fcs_blocks, fcs_chans, digits=0):
+    """Write flow events to a comma-separated value file.
+    Blocks of events are formatted in parallel threads and written in order.
+    Values are written in the shortest representation of their double precision
+    value, which reads back identically unless rounded to fewer digits.
+
+    Keyword arguments:
+    csv_file -- binary file handle opened for writing
+    fcs_blocks -- iterable of 2-D NumPy arrays of events
+    fcs_chans -- list of channel names for the header
+    digits -- number of significant digits, 0 keeps all (default 0)
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.csv as pacsv
+
+    csv_schema = pa.schema([(f"{pos}", pa.float64()) for pos in range(len(fcs_chans))])
+
+    def format_block(fcs_block):
+        csv_block = np.asarray(fcs_block, dtype=np.float64)
+        if digits:
+            csv_block = round_digits(csv_block, digits)
+        csv_buffer = pa.BufferOutputStream()
+        pacsv.write_csv(
+            pa.Table.from_arrays(
+                list(np.ascontiguousarray(csv_block.T)),  # columns
+                schema=csv_schema,
+            ),
+            csv_buffer,
+            write_options=pacsv.WriteOptions(include_header=False),
+        )
+        return csv_buffer.getvalue()
+
+    threads = os.cpu_count() or 1
+    csv_file.write((",".join(fcs_chans) + "\n").encode("utf-8"))  # unquoted
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        csv_futures = collections.deque()
+        for fcs_block in fcs_blocks:  # read in order
+            csv_futures.append(executor.submit(format_block, fcs_block))
+            if len(csv_futures) > 2 * threads:  # limit memory
+                csv_file.write(csv_futures.popleft().result())
+        while csv_futures:
+            csv_file.write(csv_futures.popleft().result())
+
+
+def write_table(table_file, fcs_blocks, fcs_chans, table_format, compression=None):
+    """Write flow events to a columnar file, one row group or record batch per block.
+    Columns are named by channel and keep the data type of the first block,
+    single precision without events. Repeated channel names are numbered
+    like in pandas ("name.1").
+
+    Keyword arguments:
+    table_file -- binary file handle opened for writing
+    fcs_blocks -- iterable of 2-D NumPy arrays of events
+    fcs_chans -- list of channel names for the columns
+    table_format -- "parquet" or "feather"/"arrow" (IPC file)
+    compression -- codec, e.g. "zstd", "snappy" or "lz4" (default "None")
+    """
+    import pyarrow as pa  # lazy
+    import pyarrow.ipc as paipc
+    import pyarrow.parquet as papq
+
+    table_chans = []
+    for fcs_chan in fcs_chans:
+        table_chan, count = fcs_chan, 0
+        while table_chan in table_chans:  # unique names only
+            count += 1
+            table_chan = f"{fcs_chan}.{count}"
+        table_chans.append(table_chan)
+    fcs_blocks = iter(fcs_blocks)
+    first_block = next(fcs_blocks, None)
+    table_dtype = np.dtype(np.float32 if first_block is None else first_block.dtype)
+    table_dtype = table_dtype.newbyteorder("=")  # native byte order
+    table_schema = pa.schema(
+        [(table_chan, pa.from_numpy_dtype(table_dtype)) for table_chan in table_chans]
+    )
+    with (
+        papq.ParquetWriter(
+            table_file, table_schema, compression=compression or "snappy"
+        )
+        if table_format == "parquet"
+        else paipc.new_file(
+            table_file,
+            table_schema,
+            options=paipc.IpcWriteOptions(compression=compression),
+        )
+    ) as table_writer:
+        for fcs_block in itertools.chain(
+            [] if first_block is None else [first_block], fcs_blocks
+        ):
+            table_block = np.asarray(fcs_block, dtype=table_dtype)
+            table_writer.write_table(
+                pa.Table.from_arrays(
+                    list(np.ascontiguousarray(table_block.T)),  # columns
+                    schema=table_schema,
+                ),
+                len(table_block),  # one row group or record batch
+            )
@@ -0,0 +1,297 @@
+"""
+flowtools.transform - compensate and transform flow cytometry events
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import fnmatch
+import functools
+import os
+import warnings
+
+import numpy as np
+
+from .fcs import get_chans, read_text, select_chans
+
+
+def add_arguments(parser):
+    """Add the command line arguments of compensation and transforms to a parser.
+
+    Keyword arguments:
+    parser -- argparse.ArgumentParser of a command line tool
+    """
+    parser.add_argument(
+        "--compensate",
+        action="store_true",
+        help="apply the spillover matrix ($SPILLOVER or $SPILL) of each file",
+    )
+    parser.add_argument(
+        "--transform",
+        choices=["arcsinh", "logicle"],
+        default=None,
+        help="transform compensated or selected channels (default: none)",
+    )
+    parser.add_argument(
+        "--transform-channels",
+        nargs="+",
+        default=None,
+        help="transform channels matching these names or patterns (pnn or pns)",
+    )
+    parser.add_argument(
+        "--cofactors",
+        nargs="+",
+        default=[f"{COFACTOR:g}"],
+        help="arcsinh cofactor for all channels or NAME=VALUE per channel (default: 150)",
+    )
+    parser.add_argument(
+        "--logicle",
+        nargs=3,
+        type=float,
+        metavar=("T", "W", "M"),
+        default=[262144.0, 0.5, 4.5],
+        help="top, linear width and decades of logicle scales (default: 262144 0.5 4.5)",
+    )
+
+
+def apply_steps(events, steps):
+    """Return a block of events compensated and transformed by processing steps.
+    All steps are applied to one floating-point copy of the block,
+    integer values are converted to floating point first.
+
+    Keyword arguments:
+    events -- 2-D NumPy array of events
+    steps -- list of processing steps as returned by get_steps
+    """
+    if not steps:
+        return events
+    events = events.astype(np.result_type(events.dtype, np.float32))  # native copy
+    for step, chan_idxs, step_params in steps:
+        if step == "compensate":
+            events[:, chan_idxs] = events[:, chan_idxs] @ step_params
+        elif step == "arcsinh":
+            events[:, chan_idxs] = np.arcsinh(events[:, chan_idxs] / step_params)
+        else:  # logicle
+            data_start, data_scale, scale_values, scale_steps = step_params
+            table_idxs = (events[:, chan_idxs] - data_start) * data_scale
+            np.clip(table_idxs, 0, len(scale_values) - 1, out=table_idxs)
+            table_rows = table_idxs.astype(np.intp)  # no search on uniform grid
+            events[:, chan_idxs] = (
+                scale_values[table_rows]
+                + (table_idxs - table_rows) * scale_steps[table_rows]
+            )
+    return events
+
+
+def get_cofactors(specs):
+    """Return a dictionary of arcsinh cofactors by channel name or pattern
+       from command line values, a value without name applies to all channels.
+
+    Keyword arguments:
+    specs -- list of strings like "150" or "CD3*=5"
+    """
+    cofactors = {}
+    for spec in specs:
+        name, _, value = spec.rpartition("=")
+        cofactors[name or "*"] = float(value)
+        if cofactors[name or "*"] <= 0:
+            raise ValueError(f'Cofactor "{spec}" is not positive')
+    return cofactors
+
+
+@functools.lru_cache(maxsize=8)
+def get_logicle(top=262144.0, width=0.5, decades=4.5, size=2**20):
+    """Return a lookup table of the logicle scale as evenly spaced data values
+       and their display values between 0 and 1, after Parks et al. (2006).
+    The scale is linear around zero over the width and logarithmic towards
+    the top of the data range. Evenly spaced data values let display values
+    be interpolated by index instead of by search.
+
+    Keyword arguments:
+    top -- data value at the top of the scale (default 262144.0)
+    width -- decades of the linear region (default 0.5)
+    decades -- decades of the whole scale (default 4.5)
+    size -- number of entries in the table (default 2**20)
+    """
+    if not 0 <= width <= decades / 2 or top <= 0:
+        raise ValueError(f"Invalid logicle parameters: {top}, {width}, {decades}")
+
+    # solve width = 2 * p * log10(p) / (p + 1) for p by bisection
+    low, high = 1.0, 1e6
+    for _ in range(100):
+        p = (low + high) / 2
+        if 2 * p * np.log10(p) / (p + 1) < width:
+            low = p
+        else:
+            high = p
+    p = (low + high) / 2
+    scale_values = np.linspace(0.0, 1.0, size)
+    z = scale_values * decades - width  # decades from linear region
+    data_values = (
+        np.sign(z)
+        * top
+        * 10.0 ** -(decades - width)
+        * (10.0 ** np.abs(z) - p**2 * 10.0 ** (-np.abs(z) / p) + p**2 - 1)
+    )  # symmetric around zero
+
+    # resample on evenly spaced data values
+    even_values = np.linspace(data_values[0], data_values[-1], size)
+    return even_values, np.interp(even_values, data_values, scale_values)
+
+
+def get_spill(flow_text):
+    """Return the channel names and the spillover matrix from the TEXT keywords
+       of a flow cytometry file, or "None" if the file has no matrix.
+
+    Keyword arguments:
+    flow_text -- TEXT keyword dictionary
+    """
+    for key in ("spillover", "spill"):  # FCS 3.1, earlier FACSDiva
+        if flow_text.get(key, "").strip():
+            break
+    else:
+        return None
+    values = [value.strip() for value in flow_text[key].split(",")]
+    chan_count = int(values[0])
+    if len(values) != 1 + chan_count + chan_count**2:
+        raise ValueError(f'Keyword "{key}" has {len(values)} values')
+    return values[1 : chan_count + 1], np.array(
+        values[chan_count + 1 :], dtype=np.float64
+    ).reshape((chan_count, chan_count))
+
+
+def get_steps(
+    flow_path,
+    flow_text,
+    compensate=False,
+    transform=None,
+    channels=None,
+    cofactors=None,
+    logicle=(262144.0, 0.5, 4.5),
+):
+    """Return the processing steps of a flow cytometry file as a list of step
+       names, column indices and parameters to apply to blocks of its events.
+    Compensation multiplies the spillover channels by the inverse of the
+    spillover matrix. Transforms apply to the selected channels, to the
+    compensated channels if none are selected, or to all channels otherwise.
+
+    Keyword arguments:
+    flow_path -- the path to a flow cytometry file
+    flow_text -- TEXT keyword dictionary, possibly from the metadata cache
+    compensate -- apply the spillover matrix of the file (default "False")
+    transform -- "arcsinh", "logicle" or "None" (default "None")
+    channels -- list of channel names or patterns to transform (default "None")
+    cofactors -- arcsinh cofactors by channel name or pattern, "*" for others (default "None")
+    logicle -- top, width and decades of the logicle scale (default (262144.0, 0.5, 4.5))
+    """
+    flow_chans = get_chans(flow_text)
+    flow_name = os.path.basename(flow_path)
+    steps = []
+    comp_poss = []
+    if compensate:
+        if not {"spillover", "spill"} & set(flow_text):
+            flow_text = read_text(flow_path)  # not in metadata cache
+        try:
+            flow_spill = get_spill(flow_text)
+        except ValueError as err:
+            warnings.warn(f'"{flow_name}" {err}')
+            flow_spill = None
+        if flow_spill is None:
+            warnings.warn(f'"{flow_name}" is not compensated')
+        else:
+            spill_names, spill_matrix = flow_spill
+            name_poss = {chan["pnn"]: pos for pos, chan in flow_chans.items()}
+            comp_poss = [name_poss.get(name) for name in spill_names]
+            if None in comp_poss:
+                warnings.warn(f'"{flow_name}" is missing spillover channels')
+                comp_poss = []
+            else:
+                steps.append(
+                    (
+                        "compensate",
+                        np.array(comp_poss) - 1,
+                        np.linalg.solve(
+                            spill_matrix, np.eye(len(spill_names))
+                        ),  # inverse, solved once per file
+                    )
+                )
+    if transform:
+        trans_poss = (
+            select_chans(flow_chans, channels)
+            if channels or not comp_poss
+            else comp_poss
+        )
+        trans_idxs = np.array(trans_poss, dtype=np.intp) - 1
+        if transform == "arcsinh":
+            cofactors = dict(cofactors or {})
+            default_cofactor = cofactors.pop("*", COFACTOR)
+            chan_cofactors = []
+            for pos in trans_poss:
+                chan_labels = [label for label in flow_chans[pos].values() if label]
+                chan_cofactors.append(
+                    next(
+                        (
+                            cofactor
+                            for pat, cofactor in cofactors.items()
+                            if any(
+                                fnmatch.fnmatchcase(label, pat) for label in chan_labels
+                            )
+                        ),
+                        default_cofactor,
+                    )  # first matching pattern
+                )
+            steps.append(("arcsinh", trans_idxs, np.array(chan_cofactors)))
+        elif transform == "logicle":
+            data_values, scale_values = get_logicle(*logicle)
+            steps.append(
+                (
+                    "logicle",
+                    trans_idxs,
+                    (
+                        data_values[0],
+                        (len(data_values) - 1) / (data_values[-1] - data_values[0]),
+                        scale_values,
+                        np.diff(scale_values, append=scale_values[-1]),  # slopes
+                    ),
+                )
+            )
+        else:
+            raise ValueError(f'Unknown transform "{transform}"')
+    return steps
+
+
+def get_transforms(args):
+    """Return the keyword arguments of get_steps from parsed command line
+       arguments, or "None" if events are neither compensated nor transformed.
+
+    Keyword arguments:
+    args -- argparse.Namespace with the arguments added by add_arguments
+    """
+    if not args.compensate and not args.transform:
+        return None
+    return {
+        "compensate": args.compensate,
+        "transform": args.transform,
+        "channels": args.transform_channels,
+        "cofactors": get_cofactors(args.cofactors),
+        "logicle": tuple(args.logicle),
+    }
+
+
+# set default cofactor of arcsinh transforms
+COFACTOR = 150.0  # fluorescence, mass cytometry uses 5
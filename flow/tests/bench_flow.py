@@ -0,0 +1,274 @@
+"""
+bench_flow - benchmark flow tools on synthetic files
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+
+def get_revision(repo_path):
+    """Return the abbreviated commit hash of a git repository or "None".
+
+    Keyword arguments:
+    repo_path -- the path to a directory inside the repository
+    """
+    try:
+        return subprocess.run(
+            ["git", "-C", repo_path, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def list_files(dir_path):
+    """Return the set of all file paths in a directory structure.
+
+    Keyword arguments:
+    dir_path -- the path to a directory
+    """
+    return {
+        os.path.join(root, file_name)
+        for root, _, file_names in os.walk(dir_path)
+        for file_name in file_names
+    }
+
+
+def run_tool(script_path, script_args, work_dir):
+    """Run a script in a working directory like from the command line
+       and return its wall time in seconds and peak resident memory in bytes.
+    Peak memory includes the script's worker processes and is "None"
+    on systems without wait4. Prompts are confirmed.
+
+    Keyword arguments:
+    script_path -- the path to a Python script
+    script_args -- list of command line arguments
+    work_dir -- the path to the working directory of the script
+    """
+    env = dict(os.environ)
+    env.pop("PYTEST_CURRENT_TEST", None)  # use working directory
+    with tempfile.TemporaryFile() as err_file:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, script_path, *script_args],
+            cwd=work_dir,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=err_file,  # warnings
+        )
+        proc.stdin.write(b"y\n")  # confirm removing channels
+        proc.stdin.close()
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            proc.wait()
+            peak_rss = None
+        wall_time = time.perf_counter() - start
+        if proc.returncode:
+            err_file.seek(0)
+            sys.exit(
+                f'"{os.path.basename(script_path)}" failed:\n'
+                + err_file.read().decode("utf-8", "replace")[-2000:]
+            )
+    return wall_time, peak_rss
+
+
+# set benchmark runs with script, arguments and input files
+BENCH_RUNS = {
+    "read_native": ("bench_read.py", ["--reader", "native"], "fcs"),
+    "read_flowio": ("bench_read.py", ["--reader", "flowio"], "fcs"),
+    "fcs_to_csv": ("fcs_to_csv.py", [], "fcs"),
+    "fcs_to_parquet": ("fcs_to_csv.py", ["--format", "parquet"], "fcs"),
+    "concat_fcs": ("concat_fcs.py", [], "fcs"),
+    "concat_fcs_stream": ("concat_fcs.py", ["--stream"], "fcs"),
+    "csv_to_fcs": ("csv_to_fcs.py", [], "csv"),
+    "csv_to_fcs_stream": ("csv_to_fcs.py", ["--stream"], "csv"),
+}
+
+# set scripts reading files without tool options
+READ_SCRIPTS = {"bench_read.py"}
+
+if __name__ == "__main__":
+    # parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Benchmark flow tools on synthetic files."
+    )
+    parser.add_argument(
+        "--cells", type=int, default=100_000, help="events per file (default: 100000)"
+    )
+    parser.add_argument(
+        "--channels", type=int, default=50, help="channels per file (default: 50)"
+    )
+    parser.add_argument(
+        "--files", type=int, default=10, help="number of files (default: 10)"
+    )
+    parser.add_argument(
+        "--runs",
+        nargs="+",
+        choices=list(BENCH_RUNS),
+        default=list(BENCH_RUNS),
+        help="benchmark runs (default: all)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="repetitions of each run (default: 1)"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="maximum number of files processed in parallel by each tool (default: 1)",
+    )
+    parser.add_argument(
+        "--tools-path",
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        help="directory with the tools to benchmark (default: this checkout)",
+    )
+    parser.add_argument(
+        "--path",
+        default=None,
+        help="directory for synthetic files, kept after the run (default: temporary)",
+    )
+    parser.add_argument(
+        "--results",
+        default="bench_flow.json",
+        help="JSON file for results (default: bench_flow.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="FILE",
+        default=None,
+        help="JSON results of a previous run to compare events/s with",
+    )
+    args = parser.parse_args()
+
+    # create synthetic files
+    bench_path = os.path.abspath(args.path or tempfile.mkdtemp(prefix="bench_flow_"))
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    input_stats = {}  # {input: {'paths': set, 'bytes': int}}
+    for input_name in sorted({BENCH_RUNS[run_name][2] for run_name in args.runs}):
+        input_path = os.path.join(bench_path, input_name)
+        os.makedirs(input_path, exist_ok=True)
+        print(f'Creating {input_name} files in "{input_path}"')
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(script_path, f"create_{input_name}.py"),
+                "--cells",
+                str(args.cells),
+                "--channels" if input_name == "fcs" else "--columns",
+                str(args.channels),
+                "--files",
+                str(args.files),
+                "--path",
+                input_path,
+            ],
+            check=True,
+        )
+        input_paths = list_files(input_path)
+        input_stats[input_name] = {
+            "paths": input_paths,
+            "bytes": sum(os.path.getsize(path) for path in input_paths),
+        }
+
+    # run benchmarks
+    compare_runs = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as compare_file:
+            compare_runs = {run["name"]: run for run in json.load(compare_file)["runs"]}
+    bench_runs = []
+    print(f"\n{'run':<20}{'wall [s]':>10}{'events/s':>14}{'MB/s':>10}{'RSS [MB]':>10}")
+    for run_name in args.runs:
+        script_name, script_args, input_name = BENCH_RUNS[run_name]
+        if script_name in READ_SCRIPTS:  # located next to this script
+            script_args = script_args + ["--tools-path", args.tools_path]
+            run_path = os.path.join(script_path, script_name)
+        else:
+            script_args = script_args + ["--processes", str(args.processes)]
+            run_path = os.path.join(args.tools_path, script_name)
+        input_path = os.path.join(bench_path, input_name)
+        for count in range(args.repeat):
+            wall_time, peak_rss = run_tool(run_path, script_args, input_path)
+            for out_path in list_files(input_path) - input_stats[input_name]["paths"]:
+                os.remove(out_path)  # same inputs for every run
+            event_count = args.cells * args.files
+            bench_runs.append(
+                {
+                    "name": run_name,
+                    "args": script_args,
+                    "repeat": count + 1,
+                    "files": args.files,
+                    "events": event_count,
+                    "bytes": input_stats[input_name]["bytes"],
+                    "wall_s": wall_time,
+                    "events_per_s": event_count / wall_time,
+                    "mb_per_s": input_stats[input_name]["bytes"] / wall_time / 1e6,
+                    "peak_rss_mb": peak_rss / 1e6 if peak_rss is not None else None,
+                }
+            )
+            run = bench_runs[-1]
+            print(
+                f"{run_name:<20}{wall_time:>10.2f}{run['events_per_s']:>14,.0f}"
+                f"{run['mb_per_s']:>10.1f}"
+                + (f"{run['peak_rss_mb']:>10.1f}" if peak_rss is not None else "")
+                + (
+                    f"  ({run['events_per_s'] / compare_runs[run_name]['events_per_s']:.2f}x)"
+                    if run_name in compare_runs
+                    else ""
+                )
+            )
+
+    # write results
+    with open(args.results, "w", encoding="utf-8") as results_file:
+        json.dump(
+            {
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "revision": get_revision(args.tools_path),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "cells": args.cells,
+                "channels": args.channels,
+                "files": args.files,
+                "processes": args.processes,
+                "runs": bench_runs,
+            },
+            results_file,
+            indent=2,
+        )
+    print(f'\nResults written to "{os.path.abspath(args.results)}"')
+
+    # remove synthetic files
+    if not args.path:
+        shutil.rmtree(bench_path)
@@ -0,0 +1,55 @@
+"""
+bench_read - read flow cytometry files natively or with FlowIO
+Copyright (C) 2025 The Regents of the University of Colorado
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+Author:     Christian Rickert <christian.rickert@cuanschutz.edu>
+Date:       2025-10-08
+DOI:        10.5281/zenodo.17298096
+URL:        https://github.com/rickert-lab/tools
+Version:    0.2
+"""
+
+import argparse
+import os
+import sys
+
+
+if __name__ == "__main__":
+    # parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Read flow cytometry files in the working directory."
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["native", "flowio"],
+        default="native",
+        help="parser of the DATA segment (default: native)",
+    )
+    parser.add_argument(
+        "--tools-path",
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        help="directory with the tools to benchmark (default: this checkout)",
+    )
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.tools_path))
+    from flowtools.fcs import read_fcs, read_flowio
+
+    # read events and touch every value
+    for flow_name in sorted(os.listdir(".")):
+        if flow_name.lower().endswith(".fcs"):
+            if args.reader == "native":
+                flow_events = read_fcs(flow_name)[2]
+            else:
+                flow_events = read_flowio(flow_name)
+            print(f'"{flow_name}": {flow_events.sum(dtype="float64"):.6g}')
@@ -20,18 +20,31 @@ URL:        https://github.com/rickert-lab/tools
 Version:    0.1
 """
 
+import argparse
 import os
 
 import pandas as pd
 import numpy as np
 
+# parse command line arguments
+parser = argparse.ArgumentParser(
+    description="Create comma-separated value files for testing."
+)
+parser.add_argument("--cells", type=int, default=100, help="rows per file")
+parser.add_argument(
+    "--columns", type=int, default=4, help="columns per file, extra ones are numeric"
+)
+parser.add_argument("--files", type=int, default=3, help="number of files")
+parser.add_argument("--path", default=r"./tests", help="output directory")
+args = parser.parse_args()
+
 # set fixed random seed
 np.random.seed(42)
 
 # set parameters
-cells = 100
-csv_path = r"./tests"
-files = 3
+cells = args.cells
+csv_path = args.path
+files = args.files
 
 for i in range(files):
     # write data
@@ -41,6 +54,8 @@ for i in range(files):
         "area [μm²]": np.random.rand(cells) * 100,  # random floats between 0 and 100
         "mean": np.random.rand(cells) * 10,  # random floats between 0 and 10
     }
+    for col in range(len(csv_data), args.columns):
+        csv_data[f"mean_{col - 2}"] = np.random.rand(cells) * 10  # more channels
     csv_frame = pd.DataFrame(csv_data)
     with open(
         os.path.abspath(os.path.join(csv_path, "test_" + str(i + 1) + ".csv")), "w"
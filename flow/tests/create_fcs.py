@@ -20,20 +20,35 @@ URL:        https://github.com/rickert-lab/tools
 Version:    0.1
 """
 
+import argparse
 import array
 import os
 
 import flowio as fio
 import numpy as np
 
+# parse command line arguments
+parser = argparse.ArgumentParser(description="Create flow cytometry files for testing.")
+parser.add_argument("--cells", type=int, default=100, help="events per file")
+parser.add_argument("--channels", type=int, default=4, help="channels per file")
+parser.add_argument("--files", type=int, default=3, help="number of files")
+parser.add_argument("--path", default=r"./tests", help="output directory")
+args = parser.parse_args()
+if args.channels < 4:
+    parser.error("--channels must be at least 4")
+
 # set fixed random seed
 np.random.seed(42)
 
 # set parameters
-cells = 100
-channels = ["Chan_A", "Chan_B", "Chan_C", "Chan_D"]
-files = 3
-flow_path = r"./tests"
+cells = args.cells
+channels = [
+    f"Chan_{chr(ord('A') + pos) if pos < 26 else pos + 1}"
+    for pos in range(args.channels + 1)
+]  # "Chan_A" to "Chan_Z", then "Chan_27"
+extra_channel = channels.pop()
+files = args.files
+flow_path = args.path
 
 # write data
 for i in range(files):
@@ -42,7 +57,8 @@ for i in range(files):
     )  # shape: (cells, channels)
     match i:
         case 1:
-            channels.append("Chan_E")  # additional channel at last position, add column
+            # additional channel at last position, add column
+            channels.append(extra_channel)
             cells_chans = np.concatenate(
                 (cells_chans, np.random.rand(cells_chans.shape[0], 1)), axis=1
             )
@@ -50,7 +66,9 @@ for i in range(files):
             channels[3] = "Chan_C"  # channel in wrong position, don't add column
         case _:
             pass
-    flow_data = array.array("f", cells_chans.reshape(-1))  # flatten
+    flow_data = array.array(
+        "f", cells_chans.astype(np.float32).tobytes()
+    )  # flatten without Python floats
     with open(
         os.path.abspath(os.path.join(flow_path, "test_" + str(i + 1) + ".fcs")),
         "wb",
@@ -23,12 +23,15 @@ Version:    0.2
 import array
 import json
 import os
+import shutil
 import subprocess
 import pytest
 
 import flowio as fio
 import numpy as np
 import pandas as pd
+import pyarrow.feather as pafe
+import pyarrow.parquet as papq
 
 
 def fail():
@@ -150,6 +153,408 @@ class TestCreateFCS:
                 os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
             )  # flow_path
         os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+
+    def test_concat_fcs_threads(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run concatenation with serial and parallel channel checks
+        for threads in ("1", "4"):
+            concat_fcs_result = subprocess.run(
+                ["python", os.path.abspath("concat_fcs.py"), "--threads", threads],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            ).stdout
+            # check terminal output
+            with open(
+                os.path.abspath("./tests/test_concat_fcs.txt"), "r", encoding="utf-8"
+            ) as lf:
+                concat_fcs_expected = lf.read()
+            assert concat_fcs_result == concat_fcs_expected
+            os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+            os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+        # cleanup
+        for f in range(3):
+            os.remove(
+                os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
+            )  # flow_path
+
+    def test_concat_fcs_processes(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        # run concatenation in one and in multiple processes
+        concat_results = []
+        for processes in ("1", "2"):
+            subprocess.run(
+                [
+                    "python",
+                    os.path.abspath("concat_fcs.py"),
+                    "--stream",
+                    "--processes",
+                    processes,
+                ],
+                check=True,
+            )
+            with open(concat_path, "rb") as concat_file:
+                concat_results.append(concat_file.read())
+            os.remove(concat_path)
+            os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        # check output files
+        assert concat_results[0] == concat_results[1]
+        # cleanup
+        for f in range(3):
+            os.remove(
+                os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
+            )  # flow_path
+        os.remove(os.path.abspath("./tests/tests_concat_sources.json"))
+
+    def test_concat_fcs_files(self, monkeypatch):
+        resource = pytest.importorskip("resource")  # limit open files
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        from flowtools.fcs import write_fcs
+
+        # create more files than file descriptors
+        flow_dir = os.path.abspath("./tests/files")
+        os.makedirs(flow_dir)
+        for f in range(200):
+            write_fcs(
+                os.path.join(flow_dir, f"test_{f + 1:03d}.fcs"),
+                ["Chan_A", "Chan_B", "Chan_C", "Chan_D"],
+                [np.full((10, 4), f, dtype=np.float32)],
+            )
+        # run concatenation in memory with few file descriptors
+        concat_path = os.path.join(flow_dir, "tests_concat.fcs")
+        subprocess.run(
+            [
+                "python",
+                "-c",
+                (
+                    "import resource, sys, flowtools; "
+                    f"resource.setrlimit(resource.RLIMIT_NOFILE, (128, {resource.getrlimit(resource.RLIMIT_NOFILE)[1]})); "
+                    "flowtools.concat(path=sys.argv[1], concat_path=sys.argv[2])"
+                ),
+                flow_dir,
+                concat_path,
+            ],
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        concat_data = fio.FlowData(concat_path)
+        assert concat_data.event_count == 2000
+        assert np.array_equal(
+            np.reshape(concat_data.events, (-1, 4))[::10, 0], np.arange(200)
+        )
+        # cleanup
+        shutil.rmtree(flow_dir)
+
+    def test_concat_fcs_shards(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run concatenation in one file
+        subprocess.run(["python", os.path.abspath("concat_fcs.py")], check=True)
+        events_expected = fio.FlowData(
+            os.path.abspath("./tests/tests_concat.fcs")
+        ).events
+        # run concatenation in multiple files
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--max-events", "120"],
+            check=True,
+        )
+        # check output files
+        events_result = array.array("f")
+        for s in range(3):
+            shard_path = os.path.abspath(
+                "./tests/tests_concat_part" + str(s + 1).zfill(4) + ".fcs"
+            )
+            shard_data = fio.FlowData(shard_path)
+            assert shard_data.event_count == (120, 120, 60)[s]
+            events_result.extend(shard_data.events)
+            os.remove(shard_path)
+            os.remove(os.path.splitext(shard_path)[0] + "_checksum.json")
+        assert events_result == events_expected
+        # check manifest
+        manifest_path = os.path.abspath("./tests/tests_concat_manifest.json")
+        with open(manifest_path, "r") as manifest_file:
+            manifest_result = json.load(manifest_file)
+        assert manifest_result["tests_concat_part0002.fcs"] == [
+            {"file": "test_2.fcs", "start": 20, "stop": 100},
+            {"file": "test_3.fcs", "start": 0, "stop": 40},
+        ]
+        # cleanup
+        for f in range(3):
+            os.remove(
+                os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
+            )  # flow_path
+        os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+        os.remove(manifest_path)
+
+    def test_concat_fcs_stream(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        # run concatenation in memory
+        subprocess.run(["python", os.path.abspath("concat_fcs.py")], check=True)
+        events_expected = fio.FlowData(concat_path).events
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        # run concatenation with streaming
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--stream"], check=True
+        )
+        # check output file
+        concat_data = fio.FlowData(concat_path)
+        assert concat_data.event_count == 300, "Cell count is not 300."
+        assert concat_data.channel_count == 3, "Channel count is not 3."
+        assert concat_data.events == events_expected
+        # cleanup
+        for f in range(3):
+            os.remove(
+                os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
+            )  # flow_path
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        os.remove(os.path.abspath("./tests/tests_concat_sources.json"))
+
+    def test_concat_fcs_append(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        sources_path = os.path.abspath("./tests/tests_concat_sources.json")
+        # run concatenation without third file
+        os.rename(
+            os.path.abspath("./tests/test_3.fcs"), os.path.abspath("./tests/test_3.bak")
+        )
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--stream"], check=True
+        )
+        events_expected = fio.FlowData(concat_path).events
+        assert len(events_expected) == 200 * 4, "Cell count is not 200."
+        with open(sources_path, "r") as sources_file:
+            assert not any(
+                source["fingerprint"]
+                for source in json.load(sources_file)["files"].values()
+            )  # no candidates
+        # add matching and mismatching files
+        os.rename(
+            os.path.abspath("./tests/test_3.bak"), os.path.abspath("./tests/test_3.fcs")
+        )
+        shutil.copy(
+            os.path.abspath("./tests/test_1.fcs"), os.path.abspath("./tests/test_4.fcs")
+        )
+        concat_fcs_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--append", concat_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            check=True,
+        ).stdout
+        assert '"test_3.fcs" is missing consensus channels' in concat_fcs_result
+        # check output file
+        concat_data = fio.FlowData(concat_path)
+        assert concat_data.event_count == 300, "Cell count is not 300."
+        assert concat_data.events[: len(events_expected)] == events_expected
+        assert (
+            concat_data.events[len(events_expected) :]
+            == fio.FlowData(os.path.abspath("./tests/test_1.fcs")).events
+        )
+        with open(sources_path, "r") as sources_file:
+            sources_result = json.load(sources_file)["files"]
+        assert {
+            source_name: source["events"]
+            for source_name, source in sources_result.items()
+        } == {
+            "test_1.fcs": 100,
+            "test_2.fcs": 100,
+            "test_4.fcs": 100,
+        }
+        # detect duplicates of appended files
+        assert '"test_4.fcs" duplicates "test_1.fcs"' in concat_fcs_result
+        assert sources_result["test_1.fcs"]["fingerprint"]  # shared layout
+        assert (
+            sources_result["test_4.fcs"]["fingerprint"]
+            == sources_result["test_1.fcs"]["fingerprint"]
+        )
+        shutil.copy(
+            os.path.abspath("./tests/test_2.fcs"), os.path.abspath("./tests/test_5.fcs")
+        )
+        concat_fcs_result = subprocess.run(
+            [
+                "python",
+                os.path.abspath("concat_fcs.py"),
+                "--append",
+                concat_path,
+                "--skip-duplicates",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            check=True,
+        ).stdout
+        assert '"test_5.fcs" duplicates "test_2.fcs", skipping' in concat_fcs_result
+        assert fio.FlowData(concat_path).event_count == 300
+        # check appended events hashed in a chain
+        with open(os.path.splitext(concat_path)[0] + "_checksum.json", "r") as sum_file:
+            assert json.load(sum_file)["segments"] == [200, 100, 0]
+        verify_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--verify"],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stdout
+        assert '"tests_concat.fcs": OK' in verify_result
+        # reject files not written with --stream
+        os.remove(sources_path)
+        concat_fcs_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--append", concat_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        assert concat_fcs_result.returncode
+        assert (
+            '"tests_concat.fcs" not written with --stream' in concat_fcs_result.stdout
+        )
+        assert "Traceback" not in concat_fcs_result.stdout
+        # cleanup
+        for f in range(5):
+            os.remove(
+                os.path.abspath(os.path.join("./tests/test_" + str(f + 1) + ".fcs"))
+            )  # flow_path
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+
+    def test_concat_fcs_append_channels(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        sources_path = os.path.abspath("./tests/tests_concat_sources.json")
+        # run concatenation of first file without second channel
+        for f in (2, 3):
+            os.rename(
+                os.path.abspath(f"./tests/test_{f}.fcs"),
+                os.path.abspath(f"./tests/test_{f}.bak"),
+            )
+        subprocess.run(
+            [
+                "python",
+                os.path.abspath("concat_fcs.py"),
+                "--stream",
+                "--exclude-channels",
+                "Chan_B",
+            ],
+            check=True,
+        )
+        with open(sources_path, "r") as sources_file:
+            assert json.load(sources_file)["channels"] == {
+                "1": "Chan_A",
+                "3": "Chan_C",
+                "4": "Chan_D",
+            }
+        # add file with the layout of the first file
+        os.rename(
+            os.path.abspath("./tests/test_2.bak"), os.path.abspath("./tests/test_2.fcs")
+        )
+        concat_fcs_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--append", concat_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            check=True,
+        ).stdout
+        assert "missing consensus channels" not in concat_fcs_result
+        assert (
+            "Removing channels:\n{2: 'Chan_B', 5: 'Chan_E'}" in concat_fcs_result
+        )  # not dropped from first file
+        concat_data = fio.FlowData(concat_path)
+        assert concat_data.event_count == 200
+        flow_data = fio.FlowData(os.path.abspath("./tests/test_2.fcs"))
+        assert np.array_equal(
+            np.reshape(concat_data.events, (-1, 3))[100:],
+            np.reshape(flow_data.events, (-1, flow_data.channel_count))[:, [0, 2, 3]],
+        )
+        # cleanup
+        for flow_name in ("test_1.fcs", "test_2.fcs", "test_3.bak"):
+            os.remove(os.path.abspath("./tests/" + flow_name))
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        os.remove(sources_path)
+
+    def test_cache(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        with open(
+            os.path.abspath("./tests/test_concat_fcs.txt"), "r", encoding="utf-8"
+        ) as lf:
+            concat_fcs_expected = lf.read()
+        for run in range(2):
+            # run concatenation with cached metadata
+            concat_fcs_result = subprocess.run(
+                ["python", os.path.abspath("concat_fcs.py"), "--cache"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            ).stdout
+            assert concat_fcs_result == concat_fcs_expected
+            assert os.path.exists(os.path.abspath("./tests/.concat_fcs_cache.json"))
+            os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+            os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+            # run conversion with cached metadata
+            fcs_to_csv_result = subprocess.run(
+                ["python", os.path.abspath("fcs_to_csv.py"), "--cache"],
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            ).stdout
+            assert ("(unchanged)" in fcs_to_csv_result) == bool(run)
+        # run conversion with changed options
+        for options in (["--digits", "2", "--channels", "Chan_A"], ["--digits", "2"]):
+            fcs_to_csv_result = subprocess.run(
+                ["python", os.path.abspath("fcs_to_csv.py"), "--cache", *options],
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            ).stdout
+            assert "(unchanged)" not in fcs_to_csv_result
+        with open(os.path.abspath("./tests/test_1.csv"), "r") as csv_file:
+            assert csv_file.readline().count(",") == 3  # all channels
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+        os.remove(os.path.abspath("./tests/.concat_fcs_cache.json"))
+        os.remove(os.path.abspath("./tests/.fcs_to_csv_cache.json"))
+
+    def test_channels(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run conversion with channel selection
+        subprocess.run(
+            ["python", os.path.abspath("fcs_to_csv.py")]
+            + ["--channels", "Chan_[ABD]", "--exclude-channels", "*_B"],
+            check=True,
+        )
+        with open(os.path.abspath("./tests/test_1.csv"), "r") as csv_file:
+            assert csv_file.readline().strip().split(",") == ["Chan_A", "Chan_D"]
+            assert np.loadtxt(csv_file, delimiter=",").shape == (100, 2)
+        # run concatenation with channel selection
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--channels", "Chan_A"],
+            check=True,
+        )
+        concat_data = fio.FlowData(os.path.abspath("./tests/tests_concat.fcs"))
+        assert concat_data.channel_count == 1
+        assert concat_data.event_count == 300
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+        os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
 
     def test_csv_to_fcs(self):
         # create temp files
@@ -239,6 +644,314 @@ class TestCreateFCS:
             os.remove(os.path.abspath(base_path + "_annots.json"))
             os.remove(os.path.abspath(base_path + "_annots.fcs"))
 
+    def test_csv_to_fcs_stream(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_csv.py")], check=True)
+        csv_frame = pd.read_csv(os.path.abspath("./tests/test_1.csv"))
+        csv_frame.loc[1, "tissue"] = None  # empty cell
+        csv_frame.to_csv(os.path.abspath("./tests/test_1.csv"), index=False)
+        # run conversion at once and in small batches
+        fcs_labels = []
+        for stream in ([], ["--stream", "--block-size", "1000"]):
+            subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py")] + stream, check=True
+            )
+            fcs_data = fio.FlowData(os.path.abspath("./tests/test_1_annots.fcs"))
+            fcs_events = np.reshape(fcs_data.events, (-1, fcs_data.channel_count))
+            with open(os.path.abspath("./tests/test_1_annots.json"), "r") as annot_file:
+                annots = {
+                    code: label
+                    for label, code in json.load(annot_file)["tissue"].items()
+                }
+            assert sorted(annots.values()) == ["stroma", "tumor"]
+            assert fcs_events[1, 1] == -1  # missing value
+            fcs_labels.append(
+                (
+                    fcs_events[:, [0, 2, 3]].tolist(),
+                    [annots.get(code) for code in fcs_events[:, 1]],
+                )
+            )
+        assert fcs_labels[0] == fcs_labels[1]
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".csv"))
+            os.remove(os.path.abspath(base_path + "_annots.csv"))
+            os.remove(os.path.abspath(base_path + "_annots.json"))
+            os.remove(os.path.abspath(base_path + "_annots.fcs"))
+
+    def test_csv_to_fcs_stream_late(self):
+        # create temp files with values beyond the first batch
+        n_rows = 5000
+        pd.DataFrame(
+            {
+                "tissue": [None] * (n_rows - 10) + ["tumor"] * 10,
+                "size": [None] * (n_rows - 10) + [1.5] * 10,
+                "mean": np.arange(n_rows, dtype="float64"),
+            }
+        ).to_csv(os.path.abspath("./tests/test_1.csv"), index=False)
+        pd.DataFrame(
+            {
+                "count": list(range(n_rows - 1)) + ["many"],  # falls back
+                "mean": np.arange(n_rows, dtype="float64"),
+            }
+        ).to_csv(os.path.abspath("./tests/test_2.csv"), index=False)
+        # run conversion at once and in small batches
+        fcs_events = []
+        for stream in ([], ["--stream", "--block-size", "1000"]):
+            subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py")] + stream, check=True
+            )
+            for f, cat_col in enumerate(("tissue", "count")):
+                base_path = "./tests/test_" + str(f + 1)
+                with open(
+                    os.path.abspath(base_path + "_annots.json"), "r"
+                ) as annot_file:
+                    assert list(json.load(annot_file)) == [cat_col]
+                fcs_data = fio.FlowData(os.path.abspath(base_path + "_annots.fcs"))
+                fcs_events.append(
+                    np.reshape(fcs_data.events, (-1, fcs_data.channel_count))
+                )
+        for f in range(2):
+            np.testing.assert_array_equal(fcs_events[f], fcs_events[f + 2])
+        # cleanup
+        for f in range(2):
+            base_path = "./tests/test_" + str(f + 1)
+            for suffix in (".csv", "_annots.csv", "_annots.json", "_annots.fcs"):
+                os.remove(os.path.abspath(base_path + suffix))
+
+    def test_csv_to_fcs_shared(self):
+        # create temp files with different categories
+        for f, tissues in enumerate((["tumor", "stroma"], ["tumor", "necrosis"])):
+            pd.DataFrame({"tissue": tissues, "mean": [1.0, 2.0]}).to_csv(
+                os.path.abspath("./tests/test_" + str(f + 1) + ".csv"), index=False
+            )
+        # run conversion with shared categories
+        for stream in ([], ["--stream"]):
+            subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py"), "--shared-annots"]
+                + stream,
+                check=True,
+            )
+            with open(
+                os.path.abspath("./tests/tests_shared_annots.json"), "r"
+            ) as annot_file:
+                assert json.load(annot_file) == {
+                    "tissue": {"necrosis": 0, "stroma": 1, "tumor": 2}
+                }
+            for f, codes in enumerate(([2, 1], [2, 0])):
+                fcs_data = fio.FlowData(
+                    os.path.abspath("./tests/test_" + str(f + 1) + "_annots.fcs")
+                )
+                assert list(fcs_data.events[::2]) == codes
+        # add file with new category
+        pd.DataFrame({"tissue": ["blood"], "mean": [3.0]}).to_csv(
+            os.path.abspath("./tests/test_3.csv"), index=False
+        )
+        subprocess.run(
+            ["python", os.path.abspath("csv_to_fcs.py"), "--shared-annots"],
+            check=True,
+        )
+        with open(
+            os.path.abspath("./tests/tests_shared_annots.json"), "r"
+        ) as annot_file:
+            assert json.load(annot_file) == {
+                "tissue": {"necrosis": 0, "stroma": 1, "tumor": 2, "blood": 3}
+            }  # previous codes unchanged
+        # look up reordered codes by value, skip empty columns
+        with open(
+            os.path.abspath("./tests/tests_shared_annots.json"), "w"
+        ) as annot_file:
+            json.dump(
+                {"tissue": {"blood": 3, "tumor": 2, "stroma": 1, "necrosis": 0}},
+                annot_file,
+            )
+        pd.DataFrame({"tissue": ["blood"], "size": [None], "mean": [3.0]}).to_csv(
+            os.path.abspath("./tests/test_3.csv"), index=False
+        )
+        for stream in ([], ["--stream"]):
+            subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py"), "--shared-annots"]
+                + stream,
+                check=True,
+            )
+            with open(
+                os.path.abspath("./tests/tests_shared_annots.json"), "r"
+            ) as annot_file:
+                assert list(json.load(annot_file)) == ["tissue"]
+            fcs_data = fio.FlowData(os.path.abspath("./tests/test_3_annots.fcs"))
+            assert list(fcs_data.events[::3]) == [3]
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".csv"))
+            os.remove(os.path.abspath(base_path + "_annots.csv"))
+            os.remove(os.path.abspath(base_path + "_annots.fcs"))
+        os.remove(os.path.abspath("./tests/tests_shared_annots.json"))
+
+    def test_table_to_fcs(self):
+        # create temp files
+        csv_frame = pd.DataFrame(
+            {
+                "tissue": ["tumor", "stroma", None, "tumor", "necrosis"] * 3,
+                "area": np.arange(15, dtype=np.float64),
+            }
+        )
+        csv_frame.to_parquet(
+            os.path.abspath("./tests/test_1.parquet"), row_group_size=4
+        )
+        csv_frame.astype({"tissue": "category"}).to_feather(
+            os.path.abspath("./tests/test_2.feather")
+        )  # dictionary-encoded
+        # run conversion of columnar files
+        subprocess.run(
+            ["python", os.path.abspath("csv_to_fcs.py")]
+            + ["--format", "parquet", "feather"],
+            check=True,
+        )
+        for f, ext in enumerate((".parquet", ".feather")):
+            base_path = "./tests/test_" + str(f + 1)
+            fcs_data = fio.FlowData(os.path.abspath(base_path + "_annots.fcs"))
+            with open(os.path.abspath(base_path + "_annots.json"), "r") as annot_file:
+                assert json.load(annot_file) == {
+                    "tissue": {"tumor": 0, "stroma": 1, "necrosis": 2}
+                }
+            assert list(fcs_data.events[0:10:2]) == [0, 1, -1, 0, 2]
+            assert list(fcs_data.events[1::2]) == list(range(15))
+            # cleanup
+            os.remove(os.path.abspath(base_path + ext))
+            os.remove(os.path.abspath(base_path + "_annots.csv"))
+            os.remove(os.path.abspath(base_path + "_annots.json"))
+            os.remove(os.path.abspath(base_path + "_annots.fcs"))
+
+    def test_dtype(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run concatenation in integers
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--dtype", "uint16"],
+            check=True,
+        )
+        concat_data = fio.FlowData(os.path.abspath("./tests/tests_concat.fcs"))
+        assert concat_data.text["datatype"] == "I"
+        assert concat_data.event_count == 300
+        # cleanup
+        for f in range(3):
+            os.remove(os.path.abspath("./tests/test_" + str(f + 1) + ".fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+        assert not os.path.exists(
+            os.path.abspath("./tests/tests_concat_sources.json")
+        )  # written in memory
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_csv.py")], check=True)
+        # run conversion in single, then double precision
+        for options in ([], ["--dtype", "float64"]):
+            csv_to_fcs_result = subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py"), "--cache", *options],
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            ).stdout
+            assert "(unchanged)" not in csv_to_fcs_result
+        fcs_data = fio.FlowData(os.path.abspath("./tests/test_1_annots.fcs"))
+        csv_frame = pd.read_csv(
+            os.path.abspath("./tests/test_1.csv"), engine="pyarrow"
+        )  # same parser
+        assert fcs_data.text["datatype"] == "D"
+        assert np.array_equal(
+            np.reshape(fcs_data.events, (-1, fcs_data.channel_count))[:, 2:],
+            csv_frame.iloc[:, 2:].to_numpy(),
+        )
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".csv"))
+            os.remove(os.path.abspath(base_path + "_annots.csv"))
+            os.remove(os.path.abspath(base_path + "_annots.json"))
+            os.remove(os.path.abspath(base_path + "_annots.fcs"))
+        os.remove(os.path.abspath("./tests/.csv_to_fcs_cache.json"))
+        # reject missing categories in integers
+        pd.DataFrame(
+            {"tissue": ["tumor", None, "stroma"], "mean": [1.0, 2.0, 3.0]}
+        ).to_csv(os.path.abspath("./tests/test_1.csv"), index=False)
+        for stream in ([], ["--stream"]):
+            csv_to_fcs_result = subprocess.run(
+                ["python", os.path.abspath("csv_to_fcs.py"), "--dtype", "uint16"]
+                + stream,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+            assert csv_to_fcs_result.returncode
+            assert (
+                '"test_1.csv" has missing values in "tissue"'
+                in csv_to_fcs_result.stdout
+            )
+            assert not os.path.exists(os.path.abspath("./tests/test_1_annots.fcs"))
+        # cleanup
+        os.remove(os.path.abspath("./tests/test_1.csv"))
+        for suffix in ("_annots.csv", "_annots.json"):
+            if os.path.exists(os.path.abspath("./tests/test_1" + suffix)):
+                os.remove(os.path.abspath("./tests/test_1" + suffix))
+
+    def test_bench(self):
+        # run benchmarks on small synthetic files
+        subprocess.run(
+            ["python", os.path.abspath("./tests/bench_flow.py")]
+            + ["--cells", "100", "--channels", "4", "--files", "3"]
+            + ["--runs", "concat_fcs", "csv_to_fcs", "read_native"]
+            + ["--results", os.path.abspath("./tests/tests_bench.json")],
+            check=True,
+        )
+        with open(os.path.abspath("./tests/tests_bench.json"), "r") as results_file:
+            bench_results = json.load(results_file)
+        assert [run["name"] for run in bench_results["runs"]] == [
+            "concat_fcs",
+            "csv_to_fcs",
+            "read_native",
+        ]
+        for run in bench_results["runs"]:
+            assert run["events"] == 300
+            assert run["wall_s"] > 0
+            assert run["events_per_s"] > 0
+        # cleanup
+        os.remove(os.path.abspath("./tests/tests_bench.json"))
+
+    def test_metrics(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run conversion in parallel and concatenation with metrics
+        subprocess.run(
+            ["python", os.path.abspath("fcs_to_csv.py")]
+            + ["--metrics", "--processes", "2"],
+            check=True,
+        )
+        subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--metrics"], check=True
+        )
+        for metrics_path, stages in (
+            ("./tests/tests_fcs_to_csv_metrics", ["discover", "parse_text"]),
+            ("./tests/tests_concat_metrics", ["discover", "parse_text", "check"]),
+        ):
+            with open(os.path.abspath(metrics_path + ".json"), "r") as metrics_file:
+                metrics = json.load(metrics_file)
+            assert all(metrics["stages"][stage]["wall_s"] >= 0 for stage in stages)
+            for stage in ("decode", "write"):
+                assert metrics["stages"][stage]["files"] == 3
+                assert metrics["stages"][stage]["events"] == 300
+            metrics_frame = pd.read_csv(os.path.abspath(metrics_path + ".csv"))
+            assert len(metrics_frame) == len(metrics["records"])
+            # cleanup
+            os.remove(os.path.abspath(metrics_path + ".json"))
+            os.remove(os.path.abspath(metrics_path + ".csv"))
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+        os.remove(os.path.abspath("./tests/tests_concat.fcs"))
+        os.remove(os.path.abspath("./tests/tests_concat_checksum.json"))
+
     def test_fcs_to_csv(self):
         # create temp files
         subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
@@ -297,3 +1010,549 @@ class TestCreateFCS:
             # cleanup
             os.remove(os.path.abspath(base_path + ".fcs"))
             os.remove(os.path.abspath(base_path + ".csv"))
+
+    def test_fcs_to_csv_digits(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run conversion with rounded values
+        subprocess.run(
+            ["python", os.path.abspath("fcs_to_csv.py"), "--digits", "3"],
+            check=True,
+        )
+        # check csv content
+        with open(os.path.abspath("./tests/test_1.csv"), "r") as csv_file:
+            assert csv_file.readline().strip() == "Chan_A,Chan_B,Chan_C,Chan_D"
+            assert csv_file.readline().strip() == "0.375,0.951,0.732,0.599"
+            assert csv_file.readline().strip() == "0.156,0.156,0.0581,0.866"
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+
+    def test_fcs_to_csv_chunks(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run conversion with default and small chunks
+        csv_bytes = []
+        for chunk_size in ("65536", "7"):
+            subprocess.run(
+                [
+                    "python",
+                    os.path.abspath("fcs_to_csv.py"),
+                    "--chunk-size",
+                    chunk_size,
+                ],
+                check=True,
+            )
+            with open(os.path.abspath("./tests/test_1.csv"), "rb") as csv_file:
+                csv_bytes.append(csv_file.read())
+        assert csv_bytes[0] == csv_bytes[1]
+        # cleanup
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+
+    def test_fcs_to_table(self, monkeypatch):
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        from flowtools.fcs import write_fcs
+
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        events_native = {
+            "float64": np.array([[0.1, 16777217.0], [-2.5, 1e300]]),
+            "uint32": np.array([[0, 16777217], [4294967295, 7]], dtype=np.uint32),
+        }
+        for f, (dtype, events) in enumerate(events_native.items()):
+            write_fcs(
+                os.path.abspath(f"./tests/test_native_{f + 1}.fcs"),
+                ["Chan_A", "Chan_B"],
+                [events],
+                dtype=dtype,
+            )
+        # run conversion to columnar formats
+        for table_format in ("parquet", "feather"):
+            subprocess.run(
+                [
+                    "python",
+                    os.path.abspath("fcs_to_csv.py"),
+                    "--format",
+                    table_format,
+                    "--compression",
+                    "zstd",
+                ],
+                check=True,
+            )
+        for f in range(3):
+            base_path = "./tests/test_" + str(f + 1)
+            fcs_data = fio.FlowData(os.path.abspath(base_path + ".fcs"))
+            chans_expected = [
+                chan.get("pns") or chan["pnn"] for chan in fcs_data.channels.values()
+            ]
+            events_expected = np.reshape(fcs_data.events, (100, -1))
+            for table in (
+                papq.read_table(os.path.abspath(base_path + ".parquet")),
+                pafe.read_table(os.path.abspath(base_path + ".feather")),
+            ):
+                assert table.column_names == (
+                    chans_expected
+                    if f < 2
+                    else [*chans_expected[:3], "Chan_C.1", "Chan_E"]
+                )
+                assert all(str(column.type) == "float" for column in table.columns)
+                assert np.array_equal(
+                    np.column_stack([column.to_numpy() for column in table.columns]),
+                    events_expected,
+                )
+            # cleanup
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".parquet"))
+            os.remove(os.path.abspath(base_path + ".feather"))
+        # keep native data types
+        for f, (dtype, events) in enumerate(events_native.items()):
+            base_path = f"./tests/test_native_{f + 1}"
+            for table in (
+                papq.read_table(os.path.abspath(base_path + ".parquet")),
+                pafe.read_table(os.path.abspath(base_path + ".feather")),
+            ):
+                table_events = np.column_stack(
+                    [column.to_numpy() for column in table.columns]
+                )
+                assert table_events.dtype == dtype
+                assert np.array_equal(table_events, events)
+            # cleanup
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".parquet"))
+            os.remove(os.path.abspath(base_path + ".feather"))
+
+    def test_fcs_to_csv_recurse(self, monkeypatch):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        os.makedirs(os.path.abspath("./tests/sub"))
+        os.rename(
+            os.path.abspath("./tests/test_3.fcs"),
+            os.path.abspath("./tests/sub/test_3.fcs"),
+        )
+        # run conversion without and with subdirectories
+        for recurse in (False, True):
+            subprocess.run(
+                ["python", os.path.abspath("fcs_to_csv.py")]
+                + (["--recurse"] if recurse else []),
+                check=True,
+            )
+            assert os.path.exists(os.path.abspath("./tests/test_1.csv"))
+            assert os.path.exists(os.path.abspath("./tests/sub/test_3.csv")) == recurse
+        # skip unreadable subdirectories
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        from flowtools.files import get_files
+
+        scandir = os.scandir
+
+        def deny_scandir(dir_path):
+            if os.path.basename(dir_path) == "sub":
+                raise PermissionError(13, "Permission denied", dir_path)
+            return scandir(dir_path)
+
+        monkeypatch.setattr(os, "scandir", deny_scandir)
+        assert sorted(
+            os.path.basename(file_path)
+            for file_path in get_files(
+                path=os.path.abspath("./tests"), pat="*.fcs", recurse=True
+            )
+        ) == ["test_1.fcs", "test_2.fcs"]
+        monkeypatch.undo()
+        # cleanup
+        for base_path in ("./tests/test_1", "./tests/test_2", "./tests/sub/test_3"):
+            os.remove(os.path.abspath(base_path + ".fcs"))
+            os.remove(os.path.abspath(base_path + ".csv"))
+        os.rmdir(os.path.abspath("./tests/sub"))
+
+    def test_convert_processes(self):
+        for script, create, suffixes in (
+            ("fcs_to_csv.py", "create_fcs.py", (".fcs", ".csv")),
+            (
+                "csv_to_fcs.py",
+                "create_csv.py",
+                (".csv", "_annots.csv", "_annots.json", "_annots.fcs"),
+            ),
+        ):
+            # create temp files
+            subprocess.run(
+                ["python", os.path.abspath(os.path.join("./tests", create))],
+                check=True,
+            )
+            # run conversion serially and in parallel within a small budget
+            out_bytes = []
+            for processes in ("1", "2"):
+                convert_result = subprocess.run(
+                    ["python", os.path.abspath(script)]
+                    + ["--processes", processes, "--memory-budget", "1"],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    check=True,
+                )
+                assert [
+                    line.split(":")[0]
+                    for line in convert_result.stdout.splitlines()[2:]
+                ] == ["1/3", "2/3", "3/3"]
+                out_bytes.append({})
+                for f in range(3):
+                    out_path = "./tests/test_" + str(f + 1) + suffixes[-1]
+                    with open(os.path.abspath(out_path), "rb") as out_file:
+                        out_bytes[-1][out_path] = out_file.read()
+            assert out_bytes[0] == out_bytes[1]
+            # cleanup
+            for f in range(3):
+                for suffix in suffixes:
+                    os.remove(os.path.abspath("./tests/test_" + str(f + 1) + suffix))
+
+    def test_api(self, monkeypatch):
+        # import package without heavy dependencies
+        subprocess.run(
+            [
+                "python",
+                "-c",
+                (
+                    "import sys, flowtools; "
+                    "assert not {'numpy', 'pandas', 'pyarrow'} & set(sys.modules)"
+                ),
+            ],
+            check=True,
+        )
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        import flowtools
+
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        flow_paths = [
+            os.path.abspath("./tests/test_" + str(f + 1) + ".fcs") for f in range(3)
+        ]
+        # run concatenation repeatedly in one process
+        concat_path = os.path.abspath("./tests/tests_api_concat.fcs")
+        for stream in (False, True):
+            with pytest.warns(UserWarning):  # wrong channel name
+                assert flowtools.concat(
+                    flow_paths,
+                    concat_path=concat_path,
+                    stream=stream,
+                    channels=["Chan_A"],
+                ) == [concat_path]
+            concat_data = fio.FlowData(concat_path)
+            assert concat_data.channel_count == 1
+            assert concat_data.event_count == 300
+        with pytest.raises(ValueError), pytest.warns(UserWarning):
+            flowtools.concat(flow_paths, concat_path=concat_path, channels=["none"])
+        # run conversion to and from columnar files
+        table_paths = flowtools.fcs_to_table(flow_paths[:1], out_format="parquet")
+        assert table_paths == [os.path.abspath("./tests/test_1.parquet")]
+        fcs_paths = flowtools.table_to_fcs(table_paths, dtype="float64")
+        assert fcs_paths == [os.path.abspath("./tests/test_1_annots.fcs")]
+        assert np.array_equal(
+            fio.FlowData(fcs_paths[0]).events, fio.FlowData(flow_paths[0]).events
+        )
+        # cleanup
+        for flow_path in flow_paths:
+            os.remove(flow_path)
+        for suffix in (".parquet", "_annots.json", "_annots.fcs"):
+            os.remove(os.path.abspath("./tests/test_1" + suffix))
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        os.remove(os.path.abspath("./tests/tests_api_concat_sources.json"))
+
+    def test_read_fcs(self, monkeypatch):
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        import flowtools
+        from flowtools.fcs import read_blocks
+
+        def write_fcs(fcs_path, version, text_items, data_bytes, data_text=True):
+            text_start = 58
+            text_items = dict(text_items)
+            text_len = 0
+            while True:  # offsets change the TEXT length
+                data_start = text_start + text_len
+                data_end = data_start + len(data_bytes) - 1
+                if data_text:
+                    text_items["$BEGINDATA"] = str(data_start)
+                    text_items["$ENDDATA"] = str(data_end)
+                flow_text = (
+                    "|"
+                    + "|".join(
+                        key + "|" + value.replace("|", "||")
+                        for key, value in text_items.items()
+                    )
+                    + "|"
+                ).encode()
+                if len(flow_text) == text_len:
+                    break
+                text_len = len(flow_text)
+            flow_head = (
+                version.encode()
+                + b"    "
+                + b"".join(
+                    str(offset).rjust(8).encode()
+                    for offset in (
+                        text_start,
+                        text_start + text_len - 1,
+                        data_start,
+                        data_end,
+                        0,
+                        0,
+                    )
+                )
+            )
+            with open(fcs_path, "wb") as fcs_file:
+                fcs_file.write(flow_head + flow_text + data_bytes)
+
+        fcs_path = os.path.abspath("./tests/tests_read.fcs")
+        # mixed bit widths in big-endian byte order with masked ranges
+        values = np.array([[1023 + 1024 * 3, 7], [5, 2**32 - 1]], dtype=np.int64)
+        write_fcs(
+            fcs_path,
+            "FCS3.1",
+            {
+                "$PAR": "2",
+                "$TOT": "2",
+                "$DATATYPE": "I",
+                "$BYTEORD": "4,3,2,1",
+                "$MODE": "L",
+                "$P1N": "FSC|A",  # escaped delimiter
+                "$P1B": "16",
+                "$P1R": "1024",
+                "$P2N": "SSC-A",
+                "$P2B": "32",
+                "$P2R": "4294967296",
+            },
+            np.array(
+                [tuple(event) for event in values], dtype=[("a", ">u2"), ("b", ">u4")]
+            ).tobytes(),
+        )
+        flow_text, flow_chans, flow_events = flowtools.read_fcs(fcs_path)
+        assert flow_chans[1]["pnn"] == "FSC|A"
+        assert np.array_equal(flow_events, [[1023, 7], [5, 2**32 - 1]])
+        assert np.array_equal(
+            np.vstack(list(read_blocks(fcs_path, flow_text, 1, [1]))),
+            [[7], [2**32 - 1]],
+        )
+        # FCS 2.0 without DATA offsets or event count in TEXT
+        values = np.arange(12, dtype=np.float32).reshape((4, 3))
+        write_fcs(
+            fcs_path,
+            "FCS2.0",
+            {"$PAR": "3", "$DATATYPE": "F", "$BYTEORD": "1,2,3,4", "$MODE": "L"}
+            | {f"$P{pos}N": f"Chan_{pos}" for pos in range(1, 4)}
+            | {f"$P{pos}B": "32" for pos in range(1, 4)}
+            | {f"$P{pos}R": "262144" for pos in range(1, 4)},
+            values.tobytes(),
+            data_text=False,
+        )
+        flow_text, flow_chans, flow_events = flowtools.read_fcs(fcs_path)
+        assert np.array_equal(flow_events, values)
+        from flowtools.to_table import convert_fcs
+
+        csv_path = os.path.splitext(fcs_path)[0] + ".csv"
+        for metrics in (False, True):
+            stage_metrics = convert_fcs(
+                fcs_path, flow_text, csv_path, metrics=metrics
+            )  # events counted from blocks
+        assert stage_metrics[-1]["events"] == 4
+        assert np.array_equal(pd.read_csv(csv_path).to_numpy(), values)
+        os.remove(csv_path)
+        # uniform bit width in big-endian byte order same as FlowIO
+        values = np.array([[1, 2**15 + 3], [2**16 - 1, 0]], dtype=">u2")
+        write_fcs(
+            fcs_path,
+            "FCS3.1",
+            {"$PAR": "2", "$TOT": "2", "$DATATYPE": "I", "$BYTEORD": "2,1"}
+            | {"$MODE": "L", "$P1N": "FSC-A", "$P2N": "SSC-A"}
+            | {"$P1B": "16", "$P2B": "16", "$P1R": "1024", "$P2R": "65536"},
+            values.tobytes(),
+        )
+        flow_data = fio.FlowData(fcs_path)
+        flow_text, flow_chans, flow_events = flowtools.read_fcs(fcs_path)
+        assert np.array_equal(
+            flow_events, np.reshape(flow_data.events, (2, 2))
+        )  # masked by FlowIO
+        # cleanup
+        os.remove(fcs_path)
+
+    def test_write_fcs(self, monkeypatch):
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        import flowtools
+        from flowtools.fcs import read_text, write_fcs, write_head
+
+        # write blocks with labels, ranges and custom keywords
+        fcs_path = os.path.abspath("./tests/tests_write.fcs")
+        values = np.arange(24, dtype=np.float64).reshape((8, 3))
+        assert (
+            write_fcs(
+                fcs_path,
+                ["FSC-A", "SSC-A", "CD3"],
+                (values[:5], values[5:]),
+                "uint16",
+                {"$P3S": "T cells", "$P1R": "1024", "$CYT": "Test/Cytometer"},
+            )
+            == 8
+        )
+        flow_text, flow_chans, flow_events = flowtools.read_fcs(fcs_path)
+        assert flow_chans[3] == {"pnn": "CD3", "pns": "T cells"}
+        assert flow_text["cyt"] == "Test/Cytometer"
+        assert flow_text["p1r"] == "1024"
+        assert np.array_equal(flow_events, values)
+        flow_data = fio.FlowData(fcs_path)
+        assert flow_data.event_count == 8
+        with pytest.raises(ValueError):
+            write_fcs(fcs_path, ["FSC-A"], [], text_items={"$TOT": "1"})
+        with pytest.raises(ValueError):
+            write_fcs(fcs_path, ["FSC-A"], [values])
+        # keep offsets past HEADER fields in TEXT only
+        with open(fcs_path, "wb") as fcs_file:
+            data_start = write_head(fcs_file, ["FSC-A"], 10**8, "float32")
+        with open(fcs_path, "rb") as fcs_file:
+            assert fcs_file.read(58)[26:42] == b"       0       0"
+        flow_text = read_text(fcs_path)
+        assert int(flow_text["begindata"]) == data_start
+        assert int(flow_text["enddata"]) == data_start + 4 * 10**8 - 1
+        # cleanup
+        os.remove(fcs_path)
+
+    def test_verify(self):
+        # create temp files
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        # run concatenation with checksum
+        subprocess.run(["python", os.path.abspath("concat_fcs.py")], check=True)
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        with open(os.path.splitext(concat_path)[0] + "_checksum.json") as sum_file:
+            sum_result = json.load(sum_file)
+        assert sum_result["events"] == 300
+        assert fio.FlowData(concat_path).text["data_blake2b"] == sum_result["checksum"]
+        # check files
+        verify_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--verify", "--threads", "2"],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stdout
+        assert '"tests_concat.fcs": OK' in verify_result
+        assert '"test_1.fcs": no checksum' in verify_result
+        # change an event in the middle of the DATA segment
+        concat_size = os.path.getsize(concat_path)
+        with open(concat_path, "r+b") as concat_file:
+            concat_file.seek(concat_size - concat_size // 4)
+            concat_byte = concat_file.read(1)
+            concat_file.seek(-1, os.SEEK_CUR)
+            concat_file.write(bytes([concat_byte[0] ^ 0xFF]))
+        verify_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--verify"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert verify_result.returncode == 1
+        assert '"tests_concat.fcs": FAILED' in verify_result.stdout
+        # cleanup
+        for f in range(3):
+            os.remove(os.path.abspath("./tests/test_" + str(f + 1) + ".fcs"))
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+
+    def test_duplicates(self):
+        # create temp files with a renamed copy
+        subprocess.run(["python", os.path.abspath("./tests/create_fcs.py")], check=True)
+        shutil.copyfile(
+            os.path.abspath("./tests/test_1.fcs"),
+            os.path.abspath("./tests/test_1_copy.fcs"),
+        )
+        concat_path = os.path.abspath("./tests/tests_concat.fcs")
+        # report duplicates
+        concat_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--cache"],
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stderr
+        assert '"test_1_copy.fcs" duplicates "test_1.fcs"' in concat_result
+        assert fio.FlowData(concat_path).event_count == 400
+        with open(os.path.abspath("./tests/.concat_fcs_cache.json")) as cache_file:
+            flow_cache = json.load(cache_file)
+        assert flow_cache["test_1.fcs"]["fingerprint"].startswith("100/4/F/")
+        # skip duplicates
+        concat_result = subprocess.run(
+            ["python", os.path.abspath("concat_fcs.py"), "--skip-duplicates"],
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stderr
+        assert '"test_1_copy.fcs" duplicates "test_1.fcs", skipping' in concat_result
+        assert fio.FlowData(concat_path).event_count == 300
+        # cleanup
+        for flow_name in ("test_1", "test_1_copy", "test_2", "test_3"):
+            os.remove(os.path.abspath("./tests/" + flow_name + ".fcs"))
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")
+        os.remove(os.path.abspath("./tests/.concat_fcs_cache.json"))
+
+    def test_transform(self, monkeypatch):
+        monkeypatch.syspath_prepend(os.path.abspath("."))
+        import flowtools
+        from flowtools.fcs import write_fcs
+        from flowtools.transform import get_logicle
+
+        # write file with spillover between fluorescence channels
+        rng = np.random.default_rng(0)
+        true_events = rng.uniform(-100, 10000, (1000, 3)).astype(np.float64)
+        spill_matrix = np.array([[1.0, 0.2], [0.05, 1.0]])
+        flow_events = true_events.copy()
+        flow_events[:, 1:] = true_events[:, 1:] @ spill_matrix
+        fcs_path = os.path.abspath("./tests/test_spill.fcs")
+        write_fcs(
+            fcs_path,
+            ["FSC-A", "FL1-A", "FL2-A"],
+            [flow_events],
+            "float64",
+            {"$SPILLOVER": "2,FL1-A,FL2-A,1,0.2,0.05,1", "$P2S": "CD3"},
+        )
+        # compensate and transform while converting
+        subprocess.run(
+            ["python", os.path.abspath("fcs_to_csv.py")]
+            + ["--compensate", "--transform", "arcsinh"]
+            + ["--cofactors", "150", "CD3=5"],
+            check=True,
+        )
+        csv_frame = pd.read_csv(os.path.abspath("./tests/test_spill.csv"))
+        assert np.allclose(csv_frame["FSC-A"], true_events[:, 0])  # untransformed
+        assert np.allclose(csv_frame["CD3"], np.arcsinh(true_events[:, 1] / 5))
+        assert np.allclose(csv_frame["FL2-A"], np.arcsinh(true_events[:, 2] / 150))
+        # compensate and transform while concatenating
+        concat_path = os.path.abspath("./tests/tests_api_concat.fcs")
+        flowtools.concat(
+            [fcs_path],
+            concat_path=concat_path,
+            dtype="float64",
+            transforms={"compensate": True, "transform": "logicle"},
+        )
+        data_values, scale_values = get_logicle()
+        concat_events = flowtools.read_fcs(concat_path)[2]
+        assert np.allclose(
+            concat_events[:, 1:],
+            np.interp(true_events[:, 1:], data_values, scale_values),
+        )
+        assert np.interp(0.0, data_values, scale_values) == pytest.approx(0.5 / 4.5)
+        assert np.interp(262144.0, data_values, scale_values) == pytest.approx(
+            1.0, abs=1e-4
+        )
+        # warn about files without spillover matrix
+        write_fcs(fcs_path, ["FSC-A"], [true_events[:, :1]], "float64")
+        with pytest.warns(UserWarning, match="not compensated"):
+            flowtools.concat(
+                [fcs_path],
+                concat_path=concat_path,
+                dtype="float64",
+                transforms={"compensate": True},
+            )
+        assert np.array_equal(flowtools.read_fcs(concat_path)[2], true_events[:, :1])
+        # cleanup
+        os.remove(fcs_path)
+        os.remove(os.path.abspath("./tests/test_spill.csv"))
+        os.remove(concat_path)
+        os.remove(os.path.splitext(concat_path)[0] + "_checksum.json")